@@ -1,28 +1,263 @@
 #!/usr/bin/env python3
 
-import sys, os, fnmatch
-if len(sys.argv) < 3:
-    print("Too few arguments!\nUsage: " + sys.argv[0].split("/")[-1] + " <pattern> <starting_path>")
-    sys.exit(1)
+# Usage:
+# find_subdirs_contents_match.py [-j WORKERS] [--index INDEX.db [--no-refresh]] <pattern> <starting_path>
+# Print, quoted, every directory under starting_path that contains a file
+# whose name matches pattern (fnmatch syntax), as soon as it is found, and
+# the total size of the matching files to stderr at the end. Directories are
+# scanned by a pool of threads, which keeps several requests in flight on
+# network file systems.
+# With --index, the names and sizes of all files under starting_path are kept
+# in an SQLite database and the query is answered from it. Before the query,
+# the index is refreshed: every directory is stat'ed, but only directories
+# whose mtime changed are listed again. A file rewritten in place does not
+# change the mtime of its directory, so its size may be out of date.
 
-def find(pattern, path):
+import sys, os, fnmatch, argparse, sqlite3
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def file_size(entry):
+    try:
+        return entry.stat().st_size
+    except OSError:
+        # e.g. a dangling symlink
+        return entry.stat(follow_symlinks=False).st_size
+
+def scan_dir(path, pattern):
+    '''
+    (path, size) of the matching files and the paths of the subdirectories
+    of one directory; like os.walk, unreadable directories are skipped and
+    symlinks to directories are not followed
+    '''
+    matches = []
+    dirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not entry.is_symlink():
+                        dirs.append(entry.path)
+                elif fnmatch.fnmatch(entry.name, pattern):
+                    matches.append((entry.path, file_size(entry)))
+    except OSError:
+        pass
+    return matches, dirs
+
+def walk(pattern, path, workers=8):
+    '''
+    Yield (path, size) of every file under path whose name matches pattern,
+    in the order in which the directories finish scanning
+    '''
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(scan_dir, path, pattern)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                matches, dirs = future.result()
+                for subdir in dirs:
+                    pending.add(pool.submit(scan_dir, subdir, pattern))
+                for match in matches:
+                    yield match
+
+def find(pattern, path, workers=8, on_subdir=None):
+    '''
+    Return the matching files, the set of directories holding them and their
+    total size in MiB; on_subdir is called with every directory when it is
+    first found
+    '''
+    return collect(walk(pattern, path, workers), on_subdir)
+
+def collect(matches, on_subdir=None):
     size = 0.0
     result = []
     subdirs = set()
-    for root, dirs, files in os.walk(path):
-        for name in files:
-            if fnmatch.fnmatch(name, pattern):
-                filepath = os.path.join(root, name)
-                size += os.path.getsize(filepath) / 1048576.
-                result.append(filepath)
-                subdirpath = '/'.join(filepath.split('/')[:-1])
-                subdirs.add(subdirpath)
+    for filepath, filesize in matches:
+        size += filesize / 1048576.
+        result.append(filepath)
+        subdirpath = '/'.join(filepath.split('/')[:-1])
+        if subdirpath not in subdirs:
+            subdirs.add(subdirpath)
+            if on_subdir is not None:
+                on_subdir(subdirpath)
     return result, subdirs, size
 
-pat = sys.argv[1]
-rootpath = sys.argv[2]
-files, subdirs, size = find(pat, rootpath)
-print('\n'.join(['"' + subdir + '"' for subdir in subdirs]))
-#print('\n'.join(subdirs))
+def scan_listing(path):
+    '''
+    (name, size) of the files and the paths of the subdirectories of one
+    directory, or None if it cannot be read
+    '''
+    files = []
+    dirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if is_dir:
+                    if not entry.is_symlink():
+                        dirs.append(entry.path)
+                else:
+                    files.append((entry.name, file_size(entry)))
+    except OSError:
+        return None
+    return files, dirs
+
+def check_dir(path, mtime_ns):
+    '''
+    (path, mtime, listing) of a directory, the listing None if the mtime is
+    still mtime_ns; mtime is None if the directory is gone
+    '''
+    try:
+        current = os.stat(path).st_mtime_ns
+    except OSError:
+        return path, None, None
+    if current == mtime_ns:
+        return path, current, None
+    listing = scan_listing(path)
+    if listing is None:
+        return path, None, None
+    return path, current, listing
+
+def subtree_range(path):
+    # all paths below path sort between these two: '0' follows '/'
+    path = path.rstrip('/')
+    return path + '/', path + '0'
+
+def glob_pattern(pattern):
+    '''
+    The SQLite GLOB equivalent of an fnmatch pattern, if there is a simple one
+    '''
+    if '[' in pattern or ']' in pattern:
+        return None
+    return pattern
+
+class FileIndex:
+    '''
+    Names and sizes of the files below some directories, in SQLite
+    '''
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS dirs (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER);
+            CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+            CREATE TABLE IF NOT EXISTS files (dir TEXT, name TEXT, size INTEGER, PRIMARY KEY (dir, name));
+            CREATE INDEX IF NOT EXISTS files_name ON files (name);
+        ''')
+        self.db.create_function("fnmatch", 2, fnmatch.fnmatchcase, deterministic=True)
+
+    def close(self):
+        self.db.close()
+
+    def remove_tree(self, path):
+        low, high = subtree_range(path)
+        self.db.execute("DELETE FROM dirs WHERE path = ? OR (path >= ? AND path < ?)", (path, low, high))
+        self.db.execute("DELETE FROM files WHERE dir = ? OR (dir >= ? AND dir < ?)", (path, low, high))
+
+    def store(self, path, parent, mtime_ns, listing):
+        '''
+        Replace what is known about one directory; return the subdirectories
+        to check next with their last known mtime
+        '''
+        files, dirs = listing
+        self.db.execute("INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                        (path, parent, mtime_ns))
+        self.db.execute("DELETE FROM files WHERE dir = ?", (path,))
+        self.db.executemany("INSERT INTO files (dir, name, size) VALUES (?, ?, ?)",
+                            [(path, name, size) for name, size in files])
+        known = dict(self.children(path))
+        for child in set(known) - set(dirs):
+            self.remove_tree(child)
+        return [(child, known.get(child)) for child in dirs]
+
+    def children(self, path):
+        return self.db.execute("SELECT path, mtime_ns FROM dirs WHERE parent = ?", (path,)).fetchall()
+
+    def mtime(self, path):
+        row = self.db.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (path,)).fetchone()
+        return row[0] if row is not None else None
+
+    def refresh(self, root, workers=8):
+        '''
+        Bring the index of the tree at root up to date, listing only the
+        directories whose mtime changed; return the number of them
+        '''
+        root = os.path.abspath(root)
+        # keep the root attached to its parent when a subtree is refreshed
+        parent = os.path.dirname(root)
+        parents = {root: parent if parent != root else None}
+        rescanned = 0
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = {pool.submit(check_dir, root, self.mtime(root))}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    path, mtime_ns, listing = future.result()
+                    parent = parents.pop(path)
+                    if mtime_ns is None:
+                        self.remove_tree(path)
+                        continue
+                    if listing is None:
+                        children = self.children(path)
+                    else:
+                        children = self.store(path, parent, mtime_ns, listing)
+                        rescanned += 1
+                    for child, child_mtime in children:
+                        parents[child] = path
+                        pending.add(pool.submit(check_dir, child, child_mtime))
+        self.db.commit()
+        return rescanned
+
+    def query(self, pattern, root):
+        '''
+        Yield (path, size) of the indexed files under root whose name matches pattern
+        '''
+        path = os.path.abspath(root)
+        low, high = subtree_range(path)
+        glob = glob_pattern(pattern)
+        if glob is not None:
+            match, arg = "name GLOB ?", glob
+        else:
+            match, arg = "fnmatch(name, ?)", pattern
+        rows = self.db.execute("SELECT dir, name, size FROM files WHERE (dir = ? OR (dir >= ? AND dir < ?)) AND " +
+                               match, (path, low, high, arg))
+        for dirpath, name, size in rows:
+            rel = os.path.relpath(dirpath, path)
+            # the path the walk from root would have produced
+            yield os.path.join(root, name) if rel == '.' else os.path.join(root, rel, name), size
+
+def find_indexed(pattern, path, index, workers=8, refresh=True, on_subdir=None):
+    '''
+    Like find, but from an index that is refreshed first unless refresh is False
+    '''
+    if refresh:
+        index.refresh(path, workers)
+    return collect(index.query(pattern, path), on_subdir)
+
+def print_subdir(subdir):
+    print('"' + subdir + '"', flush=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pattern", help="file name pattern, e.g. '*.lammpstrj'")
+    parser.add_argument("starting_path", help="the directory to search")
+    parser.add_argument("-j", "--workers", help="number of directories scanned at once (default: %(default)s)",
+                        type=int, default=8)
+    parser.add_argument("--index", help="keep an index of the tree in this SQLite file and answer from it", type=str)
+    parser.add_argument("--no-refresh", help="answer from the index without checking the tree for changes",
+                        action="store_true")
+    args = parser.parse_args()
 
-#print('\nTotal Size: {0:.2f} MiB'.format(size))
+    if args.index is not None:
+        index = FileIndex(args.index)
+        files, subdirs, size = find_indexed(args.pattern, args.starting_path, index, args.workers,
+                                            not args.no_refresh, print_subdir)
+        index.close()
+    else:
+        files, subdirs, size = find(args.pattern, args.starting_path, args.workers, print_subdir)
+    sys.stderr.write('Total Size: {0:.2f} MiB in {1:d} files\n'.format(size, len(files)))
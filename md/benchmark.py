@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+# Usage:
+# benchmark.py [--sizes 1e4 1e5 1e6] [--tools unwrap report retype xyz2lmpbond] [-o results.json] [--compare old.json]
+# Time the parse, compute and write phases of the md tools on synthetic
+# Kremer-Grest data files (see generate_kg_data.py) of the given sizes, which
+# are generated once into --workdir. Every tool and size runs in a fresh
+# process, so the peak RSS reported is that of the one run. The results, with
+# throughput in records (atoms + bonds) per second, are written as JSON
+# together with the commit and library versions; --compare prints the
+# speedup over an earlier results file.
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import numpy as np
+import lammps_data
+import generate_kg_data
+from timings import peak_rss_mib
+
+TOOLS = ["unwrap", "report", "retype", "xyz2lmpbond"]
+
+class Phases:
+    '''
+    Wall time and record count of consecutive phases
+    '''
+    def __init__(self):
+        self.phases = []
+
+    def run(self, name, records, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.phases.append({"phase": name, "seconds": time.perf_counter() - start, "records": records})
+        return result
+
+def data_records(data):
+    return int(data.atoms.size + data.bonds.size)
+
+def bench_unwrap(path, phases, out):
+    import unwrap_periodic
+    data = phases.run("parse", None, lammps_data.read_file, path)
+    records = data_records(data)
+    phases.phases[-1]["records"] = records
+    phases.run("compute", data.atoms.size, unwrap_periodic.unwrap_data, data)
+    phases.run("write", records, lammps_data.write_data, data, out)
+
+def bench_report(path, phases, out):
+    import report_bond_lengths
+    data = phases.run("parse", None, lammps_data.read_file, path)
+    phases.phases[-1]["records"] = data_records(data)
+    rows_1 = data.atom_rows(data.bonds['atom_1'])
+    rows_2 = data.atom_rows(data.bonds['atom_2'])
+    lengths = phases.run("compute", data.bonds.size, report_bond_lengths.data_bond_lengths, data)
+    phases.run("write", data.bonds.size, report_bond_lengths.write_bond_lines, out, data.atoms, data.bonds, lengths,
+               rows_1, rows_2)
+
+def bench_retype(path, phases, out):
+    import retype_atoms_by_bonds
+    data = phases.run("parse", None, lammps_data.read_file, path)
+    records = data_records(data)
+    phases.phases[-1]["records"] = records
+    phases.run("compute", records, retype_atoms_by_bonds.retype_data, data, "1,end,2")
+    phases.run("write", records, lammps_data.write_data, data, out)
+
+def bench_xyz2lmpbond(path, phases, out):
+    import xyz2lmpbond
+    with open(path) as infile:
+        comment, pos = phases.run("parse", None, xyz2lmpbond.select_frame, infile)
+    natoms = pos.shape[0]
+    phases.phases[-1]["records"] = natoms
+    box = phases.run("compute", natoms, xyz2lmpbond.fit_box, pos, 0.1)
+
+    def write():
+        lammps_data.write_lines(out, xyz2lmpbond.data_preamble(natoms, box, 1, 1.0, comment))
+        out.write("Atoms # bond\n\n")
+        xyz2lmpbond.write_atoms(out, pos, 1, 1, 1)
+    phases.run("write", natoms, write)
+
+BENCHMARKS = {"unwrap": bench_unwrap, "report": bench_report, "retype": bench_retype,
+              "xyz2lmpbond": bench_xyz2lmpbond}
+
+def run_one(tool, path):
+    '''
+    Benchmark one tool on one file in this process and return the result
+    '''
+    phases = Phases()
+    with open(os.devnull, "w") as out:
+        BENCHMARKS[tool](path, phases, out)
+    for phase in phases.phases:
+        phase["records_per_s"] = phase["records"] / phase["seconds"] if phase["seconds"] > 0. else None
+    seconds = sum([phase["seconds"] for phase in phases.phases])
+    records = phases.phases[0]["records"]
+    return {"tool": tool, "records": records, "phases": phases.phases, "seconds": seconds,
+            "records_per_s": records / seconds if seconds > 0. else None, "peak_rss_mib": peak_rss_mib()}
+
+def input_file(workdir, tool, num_atoms, seed):
+    '''
+    The synthetic input of a tool, generated on first use
+    '''
+    suffix = "xyz" if tool == "xyz2lmpbond" else "in"
+    path = os.path.join(workdir, "kg_{0:d}_{1:d}.{2:s}".format(num_atoms, seed, suffix))
+    if not os.path.exists(path):
+        os.makedirs(workdir, exist_ok=True)
+        melt = generate_kg_data.Melt(num_atoms, seed=seed)
+        with open(path + ".tmp", "w") as out:
+            if suffix == "xyz":
+                generate_kg_data.write_xyz(melt, out)
+            else:
+                generate_kg_data.write_data(melt, out)
+        os.replace(path + ".tmp", path)
+    return path
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(out, results, old_results):
+    old = {(run["tool"], run["atoms"]): run for run in old_results["runs"]}
+    out.write("# tool atoms old_s new_s speedup old_rss_mib new_rss_mib\n")
+    for run in results["runs"]:
+        key = (run["tool"], run["atoms"])
+        if key in old:
+            out.write("{0:s} {1:d} {2:.3f} {3:.3f} {4:.2f} {5:.1f} {6:.1f}\n".format(
+                run["tool"], run["atoms"], old[key]["seconds"], run["seconds"], old[key]["seconds"] / run["seconds"],
+                old[key]["peak_rss_mib"], run["peak_rss_mib"]))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", help="numbers of atoms (default: %(default)s)", nargs="+",
+                        type=lambda value: int(float(value)), default=[10000, 100000, 1000000])
+    parser.add_argument("--tools", help="tools to benchmark (default: all)", nargs="+", choices=TOOLS, default=TOOLS)
+    parser.add_argument("--repeat", help="runs per tool and size; the fastest is kept (default: %(default)s)",
+                        type=int, default=1)
+    parser.add_argument("--seed", help="seed of the synthetic data (default: %(default)s)", type=int, default=1)
+    parser.add_argument("--workdir", help="directory for the synthetic inputs (default: %(default)s)", type=str,
+                        default="bench_data")
+    parser.add_argument("-o", "--output", help="results file (default: %(default)s)", type=str,
+                        default="benchmark_results.json")
+    parser.add_argument("--compare", help="print the speedup over this earlier results file", type=str)
+    parser.add_argument("--run", help=argparse.SUPPRESS, nargs=2, metavar=("TOOL", "FILE"))
+    args = parser.parse_args()
+
+    if args.run is not None:
+        # one measurement, in a process of its own
+        json.dump(run_one(args.run[0], args.run[1]), sys.stdout)
+        return
+
+    runs = []
+    for num_atoms in args.sizes:
+        for tool in args.tools:
+            path = input_file(args.workdir, tool, num_atoms, args.seed)
+            best = None
+            for repeat in range(args.repeat):
+                child = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", tool, path],
+                                       capture_output=True, text=True, check=True)
+                result = json.loads(child.stdout)
+                if best is None or result["seconds"] < best["seconds"]:
+                    best = result
+            best["atoms"] = generate_kg_data.Melt(num_atoms).num_atoms
+            runs.append(best)
+            sys.stderr.write("{0:s} {1:d} atoms: {2:.3f} s, {3:.3g} records/s, {4:.1f} MiB\n".format(
+                tool, best["atoms"], best["seconds"], best["records_per_s"] or 0., best["peak_rss_mib"]))
+
+    results = {"commit": git_commit(), "python": platform.python_version(), "numpy": np.__version__,
+               "platform": platform.platform(), "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "runs": runs}
+    with open(args.output, "w") as out:
+        json.dump(results, out, indent=1)
+    if args.compare is not None:
+        with open(args.compare) as old:
+            compare(sys.stdout, results, json.load(old))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# Sparse (CSR) bond graph of a LAMMPS data file.
+#
+# The neighbours of atom row r are indices[indptr[r]:indptr[r + 1]], with rows
+# referring to the atoms array of lammps_data.DataFile. The graph is built
+# once from the bond arrays with a sort and a bincount, and per-atom queries
+# over neighbours are answered with array operations over all edges.
+
+import numpy as np
+
+class BondGraph:
+    def __init__(self, rows_1, rows_2, natoms):
+        ends = np.concatenate((rows_1, rows_2))
+        self.natoms = natoms
+        self.degree = np.bincount(ends, minlength=natoms)
+        others = np.concatenate((rows_2, rows_1))
+        order = np.argsort(ends, kind='stable')
+        self.indices = others[order]
+        self.indptr = np.zeros(natoms + 1, dtype=np.int64)
+        np.cumsum(self.degree, out=self.indptr[1:])
+        # the atom row each entry of indices belongs to
+        self.sources = ends[order]
+
+    @classmethod
+    def from_data(cls, data):
+        return cls(data.atom_rows(data.bonds['atom_1']), data.atom_rows(data.bonds['atom_2']),
+                   data.atoms.size)
+
+    def neighbor_count(self, mask):
+        '''
+        Number of neighbours of every atom for which mask (per atom row) is True
+        '''
+        return np.bincount(self.sources, weights=mask[self.indices],
+                           minlength=self.natoms).astype(np.int64)
+
+    def edges_from(self, rows):
+        '''
+        (source, target) rows of all edges leaving the given atom rows
+        '''
+        counts = self.degree[rows]
+        total = int(counts.sum())
+        first = self.indptr[rows] - (np.cumsum(counts) - counts)
+        offsets = np.repeat(first, counts) + np.arange(total)
+        return np.repeat(rows, counts), self.indices[offsets]
+
+    def components(self):
+        '''
+        Connected component label of every atom row: the smallest row in its
+        component. Roots are hooked onto each other along the edges and the
+        parent pointers are compressed by pointer jumping, so the number of
+        sweeps grows only logarithmically with the component size.
+        '''
+        parent = np.arange(self.natoms)
+        while True:
+            root_1 = parent[self.sources]
+            root_2 = parent[self.indices]
+            differ = root_1 != root_2
+            if not np.any(differ):
+                return parent
+            root_1 = root_1[differ]
+            root_2 = root_2[differ]
+            np.minimum.at(parent, np.maximum(root_1, root_2), np.minimum(root_1, root_2))
+            while True:
+                grandparent = parent[parent]
+                if np.array_equal(grandparent, parent):
+                    break
+                parent = grandparent
+
+    def traverse(self, seeds):
+        '''
+        Breadth-first traversal from the seed rows, one level at a time: yield
+        (parents, children) arrays for the atoms first reached at each level,
+        each child with one parent on the previous level
+        '''
+        visited = np.zeros(self.natoms, dtype=bool)
+        visited[seeds] = True
+        frontier = np.asarray(seeds)
+        while frontier.size:
+            parents, children = self.edges_from(frontier)
+            new = ~visited[children]
+            children, first = np.unique(children[new], return_index=True)
+            parents = parents[new][first]
+            visited[children] = True
+            yield parents, children
+            frontier = children
@@ -1,12 +1,18 @@
 #!/usr/bin/env python3
 
 # Usage:
-# data file
+# bond_potential.py -s <style>:<constants> -d <distance>
+# bond_potential.py -s <style>:<constants> --range <r_min> <r_max> <N> [--table bond.table [--keyword KEY]]
+# Print the energy of a bond of the given style and length. With --range,
+# print the distance, energy and force at N evenly spaced distances instead,
+# or write them as a LAMMPS bond_style table file with --table. The style
+# objects below also accept NumPy arrays of distances.
 
 import sys
 import argparse
-import math
 from enum import Enum
+import numpy as np
+import lammps_data
 
 def splitargs(argstr, num_args, style):
     args = argstr.split(',')
@@ -14,41 +20,129 @@ def splitargs(argstr, num_args, style):
         raise Exception("Incorrect number of parameters for the {0:s} bond style".format(style))
     return args
 
-def harmonic(argstr, distance):
-    args = splitargs(argstr, 2, "harmonic")
-    K = float(args[0])
-    r_0 = float(args[1])
-    return K * (distance - r_0)**2.
-
-def fene(argstr, distance):
-    args = splitargs(argstr, 4, "FENE")
-    K = float(args[0])
-    r_0 = float(args[1])
-    epsilon = float(args[2])
-    sigma = float(args[3])
-    one = -0.5 * K * r_0**2. * math.log(1 - (distance / r_0)**2.)
-    sigr = sigma / distance
-    two = 4. * epsilon * (sigr**12. - sigr**6.)
-    return one + two + epsilon
-
-styles_supported = {"harmonic": harmonic, "fene": fene}
-
-parser = argparse.ArgumentParser()
-parser.add_argument("-s", "--style", help="where STYLE is a string of the form "
-                    "<style>:[style_arg_1,style_arg2,...,style_arg_n]\n"
-                    "which contains the bond style, followed by style-specific arguments;"
-                    " supported styles:\n"
-                    "harmonic:<constant,equilibrium_distance>\n"
-                    "fene:<constant,equilibrium_distance,epsilon,sigma>", type=str, required=True)
-parser.add_argument("-d", "--distance", help="the separation between the bond atoms' centers of mass",
-                    type=float, required=True)
-args = parser.parse_args()
-style_parms = args.style.split(':')
-if len(style_parms) != 2:
-    raise Exception("Malformed bond style string '{0:s}'".format(style_parms))
-style = style_parms[0]
-if style not in styles_supported.keys():
-    raise Exception("Unsupported bond style {0:s}".format(style))
-constants = style_parms[1]
-distance = args.distance
-print(styles_supported[style](constants, distance))
+class Harmonic:
+    name = "harmonic"
+
+    def __init__(self, argstr):
+        args = splitargs(argstr, 2, "harmonic")
+        self.K = float(args[0])
+        self.r_0 = float(args[1])
+        # the longest distance at which the potential is defined
+        self.max_distance = np.inf
+
+    def energy(self, distance):
+        return self.K * (distance - self.r_0)**2.
+
+    def force(self, distance):
+        '''
+        -dE/dr; positive values push the atoms apart
+        '''
+        return -2. * self.K * (distance - self.r_0)
+
+class Fene:
+    name = "fene"
+
+    def __init__(self, argstr):
+        args = splitargs(argstr, 4, "FENE")
+        self.K = float(args[0])
+        self.r_0 = float(args[1])
+        self.epsilon = float(args[2])
+        self.sigma = float(args[3])
+        self.max_distance = self.r_0
+        # the LJ term is cut off at its minimum, as in LAMMPS bond_style fene
+        self.lj_cutoff = 2.**(1. / 6.) * self.sigma
+
+    def energy(self, distance):
+        one = -0.5 * self.K * self.r_0**2. * np.log(1 - (distance / self.r_0)**2.)
+        sigr = self.sigma / distance
+        two = np.where(distance < self.lj_cutoff, 4. * self.epsilon * (sigr**12. - sigr**6.) + self.epsilon, 0.)
+        return one + two
+
+    def force(self, distance):
+        '''
+        -dE/dr; positive values push the atoms apart
+        '''
+        one = -self.K * distance / (1 - (distance / self.r_0)**2.)
+        sigr6 = (self.sigma / distance)**6.
+        two = np.where(distance < self.lj_cutoff, 24. * self.epsilon * (2. * sigr6 * sigr6 - sigr6) / distance, 0.)
+        return one + two
+
+styles_supported = {"harmonic": Harmonic, "fene": Fene}
+
+def parse_style(text):
+    '''
+    Split a <style>:<constants> string into the style and its constants
+    '''
+    style_parms = text.split(':')
+    if len(style_parms) != 2:
+        raise Exception("Malformed bond style string '{0:s}'".format(text))
+    style = style_parms[0]
+    if style not in styles_supported.keys():
+        raise Exception("Unsupported bond style {0:s}".format(style))
+    return style, style_parms[1]
+
+def compile_style(text):
+    '''
+    Style object for a <style>:<constants> string, with the constants parsed once
+    '''
+    style, constants = parse_style(text)
+    return styles_supported[style](constants)
+
+def bond_energy(text, distance):
+    '''
+    Energy of bonds of length distance (a number or an array) for a
+    <style>:<constants> string
+    '''
+    return compile_style(text).energy(distance)
+
+def distance_range(style, r_min, r_max, num_points):
+    if num_points < 2 or not 0. < r_min < r_max:
+        raise Exception("A distance range needs 0 < r_min < r_max and at least 2 points")
+    if r_max >= style.max_distance:
+        raise Exception("The {0:s} bond style is only defined below r = {1:g}".format(style.name, style.max_distance))
+    return np.linspace(r_min, r_max, num_points)
+
+def write_table(out, style, distance, keyword, title=""):
+    '''
+    Write energies and forces at the given distances as one section of a
+    LAMMPS bond_style table file
+    '''
+    out.write("# {0:s}\n\n{1:s}\nN {2:d}\n\n".format(title or style.name, keyword, distance.size))
+    lammps_data.write_records(out, "%d %.10g %.10g %.10g", [np.arange(1, distance.size + 1), distance,
+                                                            style.energy(distance), style.force(distance)])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--style", help="where STYLE is a string of the form "
+                        "<style>:[style_arg_1,style_arg2,...,style_arg_n]\n"
+                        "which contains the bond style, followed by style-specific arguments;"
+                        " supported styles:\n"
+                        "harmonic:<constant,equilibrium_distance>\n"
+                        "fene:<constant,equilibrium_distance,epsilon,sigma>", type=str, required=True)
+    parser.add_argument("-d", "--distance", help="the separation between the bond atoms' centers of mass",
+                        type=float)
+    parser.add_argument("--range", help="evaluate energy and force at N evenly spaced distances from R_MIN to R_MAX",
+                        type=float, nargs=3, metavar=("R_MIN", "R_MAX", "N"))
+    parser.add_argument("--table", help="with --range, write a LAMMPS bond_style table file to TABLE", type=str)
+    parser.add_argument("--keyword", help="the section keyword of the table file (default: the style name in capitals)",
+                        type=str)
+    args = parser.parse_args()
+    if (args.distance is None) == (args.range is None):
+        raise Exception("Give either a --distance or a --range")
+    style = compile_style(args.style)
+
+    if args.distance is not None:
+        with np.errstate(invalid='raise', divide='raise'):
+            print(float(style.energy(args.distance)))
+        return
+    distance = distance_range(style, args.range[0], args.range[1], int(args.range[2]))
+    if args.table is not None:
+        with open(args.table, "w") as out:
+            write_table(out, style, distance, args.keyword or style.name.upper(), args.style)
+    else:
+        sys.stdout.write("# r energy force\n")
+        lammps_data.write_records(sys.stdout, "%.10g %.10g %.10g", [distance, style.energy(distance),
+                                                                     style.force(distance)])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# Single-pass summary statistics of per-bond values (e.g. bond lengths),
+# accumulated chunk by chunk so that the values never have to be held in
+# memory all at once. For every bond type, a fixed-bin histogram, the running
+# mean and variance, the extremes and the number of values above a cutoff are
+# kept; percentiles are estimated from the histograms. The top-K largest
+# values over all types are tracked together with their bond records.
+
+import numpy as np
+
+PERCENTILES = [1, 5, 25, 50, 75, 95, 99]
+
+class TypeStats:
+    def __init__(self, bins):
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.   # sum of squared deviations from the mean
+        self.min = np.inf
+        self.max = -np.inf
+        self.above = 0
+        self.hist = np.zeros(bins + 2, dtype=np.int64) # first/last bins count under/overflow
+
+    def merge(self, count, mean, m2, vmin, vmax, above, hist):
+        # Chan et al. update of the mean and variance for a batch of values
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta**2. * self.count * count / total
+        self.count = total
+        self.min = min(self.min, vmin)
+        self.max = max(self.max, vmax)
+        self.above += above
+        self.hist += hist
+
+    def variance(self):
+        return self.m2 / self.count if self.count else np.nan
+
+class BondSummary:
+    def __init__(self, bins=100, min_value=0., max_value=5., top=10, cutoff=2.5):
+        self.bins = bins
+        self.min_value = min_value
+        self.max_value = max_value
+        self.top = top
+        self.cutoff = cutoff
+        self.types = {}
+        self.top_values = np.empty(0)
+        self.top_bonds = None
+
+    def add(self, bonds, values):
+        '''
+        Accumulate the values of a chunk of bonds (a BOND_DTYPE array)
+        '''
+        if values.size == 0:
+            return
+        types, inverse = np.unique(bonds['type'], return_inverse=True)
+        inverse = inverse.ravel()
+        ntypes = types.size
+        counts = np.bincount(inverse, minlength=ntypes)
+        means = np.bincount(inverse, weights=values, minlength=ntypes) / counts
+        m2 = np.bincount(inverse, weights=(values - means[inverse])**2., minlength=ntypes)
+        mins = np.full(ntypes, np.inf)
+        np.minimum.at(mins, inverse, values)
+        maxs = np.full(ntypes, -np.inf)
+        np.maximum.at(maxs, inverse, values)
+        above = np.bincount(inverse, weights=values > self.cutoff, minlength=ntypes)
+        scaled = np.floor((values - self.min_value) * (self.bins / (self.max_value - self.min_value)))
+        np.clip(scaled, -1, self.bins, out=scaled)
+        bin_idx = scaled.astype(np.int64) + 1
+        hists = np.bincount(inverse * (self.bins + 2) + bin_idx,
+                            minlength=ntypes * (self.bins + 2)).reshape(ntypes, self.bins + 2)
+        for i, bond_type in enumerate(types.tolist()):
+            if bond_type not in self.types:
+                self.types[bond_type] = TypeStats(self.bins)
+            self.types[bond_type].merge(int(counts[i]), means[i], m2[i], mins[i], maxs[i],
+                                        int(above[i]), hists[i])
+
+        # keep the top-K values seen so far
+        if self.top > 0:
+            if values.size > self.top:
+                candidates = np.argpartition(values, -self.top)[-self.top:]
+            else:
+                candidates = np.arange(values.size)
+            if self.top_bonds is None:
+                self.top_values = values[candidates]
+                self.top_bonds = bonds[candidates]
+            else:
+                self.top_values = np.concatenate((self.top_values, values[candidates]))
+                self.top_bonds = np.concatenate((self.top_bonds, bonds[candidates]))
+            order = np.argsort(-self.top_values, kind='stable')[:self.top]
+            self.top_values = self.top_values[order]
+            self.top_bonds = self.top_bonds[order]
+
+    def percentile(self, stats, p):
+        '''
+        Estimate a percentile by linear interpolation within the histogram bin
+        '''
+        target = p / 100. * stats.count
+        cumulative = np.cumsum(stats.hist)
+        b = int(np.searchsorted(cumulative, target))
+        # values outside the histogram range are only known by their extremes
+        if b == 0:
+            return stats.min
+        if b > self.bins:
+            return stats.max
+        width = (self.max_value - self.min_value) / self.bins
+        before = cumulative[b - 1]
+        inside = stats.hist[b]
+        fraction = (target - before) / inside if inside else 0.
+        return min(max(self.min_value + (b - 1 + fraction) * width, stats.min), stats.max)
+
+    def write(self, out, name="length"):
+        width = (self.max_value - self.min_value) / self.bins
+        for bond_type in sorted(self.types):
+            stats = self.types[bond_type]
+            out.write("Bond type {0:d}: {1:d} bonds; {2:s} mean {3:.6f} std {4:.6f} min {5:.6f} "
+                      "max {6:.6f}; above {7:g}: {8:d}\n".format(bond_type, stats.count, name, stats.mean,
+                                                                 np.sqrt(stats.variance()), stats.min,
+                                                                 stats.max, self.cutoff, stats.above))
+            out.write("  percentiles (approx.): " +
+                      " ".join(["{0:d}%: {1:.4f}".format(p, self.percentile(stats, p)) for p in PERCENTILES]) +
+                      "\n")
+            out.write("  histogram ({0:s} bin start, count):\n".format(name))
+            if stats.hist[0]:
+                out.write("  <{0:.4f} {1:d}\n".format(self.min_value, int(stats.hist[0])))
+            for b in np.flatnonzero(stats.hist[1:self.bins + 1]).tolist():
+                out.write("  {0:.4f} {1:d}\n".format(self.min_value + b * width, int(stats.hist[b + 1])))
+            if stats.hist[self.bins + 1]:
+                out.write("  >={0:.4f} {1:d}\n".format(self.max_value, int(stats.hist[self.bins + 1])))
+        if self.top_bonds is not None and self.top_bonds.size:
+            out.write("Largest {0:d} {1:s}s (bond type atom_1 atom_2 {1:s}):\n".format(self.top_bonds.size, name))
+            for bond, value in zip(self.top_bonds, self.top_values.tolist()):
+                out.write("{0:d} {1:d} {2:d} {3:d} {4:.6f}\n".format(int(bond['id']), int(bond['type']),
+                                                                     int(bond['atom_1']), int(bond['atom_2']),
+                                                                     value))
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+# Usage:
+# build_walls.py (--data chains.data | --box XLO XHI YLO YHI ZLO ZHI) --padding P
+#                <starting_atom_ID> <atom_type> <molecule_id> <mass> > walls.data
+# Build the two walls of a "sandwich" confinement simulation (see
+# calculate_chain_density.py) directly, without going through an XYZ file and
+# xyz2lmpbond.py. The wall particles sit on a simple cubic lattice with a
+# spacing of about 0.8 sigma that spans the box in the confinement plane; the
+# in-plane spacing is adjusted so that the lattice continues evenly across the
+# periodic boundaries. The first
+# wall plane is placed padding away from each face of the chain box normal to
+# --axis, with any further --layers stacked outwards. The output is a data file
+# with the walls only and a box enclosing chains and walls, or with
+# --atoms-only, the atom lines for pasting into the chain data file.
+
+import argparse
+import numpy as np
+import lammps_data
+from lammps_data import Section
+import xyz2lmpbond
+import compressed_io
+
+# lattice constant of the simple cubic wall lattice, in sigma
+WALL_SPACING = 0.8
+
+AXES = {"x": 0, "y": 1, "z": 2}
+
+def read_box(path):
+    '''
+    The box of a data file, reading only the preamble
+    '''
+    box = lammps_data.Box(0., 0., 0., 0., 0., 0.)
+    with compressed_io.open_input(path) as infile:
+        for section, item in lammps_data.iter_data(infile, lammps_data.STREAM_CHUNK):
+            if section != Section.preamble:
+                break
+            lammps_data.parse_box_line(box, item)
+    return box
+
+def plane_points(length, spacing):
+    '''
+    Number of lattice points along a periodic box edge whose even spacing
+    is closest to spacing
+    '''
+    return max(int(np.round(length / spacing)), 1)
+
+def plane_coords(lower, length, spacing):
+    '''
+    Lattice coordinates along a periodic box edge, evenly spaced so that the
+    gap across the boundary is the same as the others
+    '''
+    num_points = plane_points(length, spacing)
+    return lower + (length / num_points) * np.arange(num_points)
+
+def wall_levels(box, axis, padding, spacing=WALL_SPACING, layers=1):
+    '''
+    Coordinates along axis of all wall planes, lower wall first, each wall
+    from the chains outwards
+    '''
+    steps = spacing * np.arange(layers)
+    return np.concatenate((box.dim[axis][0] - padding - steps, box.dim[axis][1] + padding + steps))
+
+class WallLattice:
+    '''
+    The wall planes of a box, generated in blocks of whole lattice rows
+    '''
+    def __init__(self, box, axis=2, padding=0., spacing=WALL_SPACING, layers=1):
+        self.axis = axis
+        self.plane_axes = [ax for ax in [0, 1, 2] if ax != axis]
+        self.levels = wall_levels(box, axis, padding, spacing, layers)
+        self.coords = [plane_coords(box.dim[ax][0], box.length(ax), spacing) for ax in self.plane_axes]
+
+    def size(self):
+        return self.levels.size * self.coords[0].size * self.coords[1].size
+
+    def bounds(self):
+        '''
+        (lowest, highest) wall plane coordinate along the axis
+        '''
+        return self.levels.min(), self.levels.max()
+
+    def blocks(self, chunk=lammps_data.WRITE_CHUNK):
+        '''
+        Yield (n, 3) position arrays of about chunk atoms, plane by plane
+        '''
+        first, second = self.coords
+        rows = max(chunk // second.size, 1)
+        for level in self.levels.tolist():
+            for start in range(0, first.size, rows):
+                grid_1, grid_2 = np.meshgrid(first[start:start + rows], second, indexing='ij')
+                pos = np.empty((grid_1.size, 3))
+                pos[:, self.plane_axes[0]] = grid_1.ravel()
+                pos[:, self.plane_axes[1]] = grid_2.ravel()
+                pos[:, self.axis] = level
+                yield pos
+
+def walls_box(box, lattice, box_padding):
+    '''
+    The box enclosing the chain box and the walls
+    '''
+    newbox = lammps_data.Box(*[bound for dim in box.dim for bound in dim])
+    lo, hi = lattice.bounds()
+    newbox.dim[lattice.axis] = [min(box.dim[lattice.axis][0], lo - box_padding),
+                                max(box.dim[lattice.axis][1], hi + box_padding)]
+    return newbox
+
+def write_walls(out, lattice, atom_idx, atom_type, mol_id, mass=None, box=None):
+    '''
+    Write the wall atoms with ids from atom_idx: a complete data file with
+    the given box, or only the atom lines if mass is None; return the number
+    of atoms written
+    '''
+    if mass is not None:
+        writer = lammps_data.DataWriter(out)
+        writer.lines(Section.preamble, xyz2lmpbond.data_preamble(lattice.size(), box, atom_type, mass,
+                                                                 "LAMMPS data file via build_walls.py"))
+        writer.advance(Section.atoms)
+    written = 0
+    for pos in lattice.blocks():
+        xyz2lmpbond.write_atoms(out, pos, atom_idx + written, mol_id, atom_type)
+        written += pos.shape[0]
+    return written
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("starting_atom_index", help="the first atom index for the wall particles (e.g. one past the last atom index in the target file)")
+    parser.add_argument("atom_type", help="the atom type of the wall particles")
+    parser.add_argument("mol_id", help="the molecule id of the wall particles")
+    parser.add_argument("mass", help="the mass of each wall particle")
+    parser.add_argument("--data", help="take the chain box from this data file", type=str)
+    parser.add_argument("--box", help="the chain box", type=float, nargs=6,
+                        metavar=("XLO", "XHI", "YLO", "YHI", "ZLO", "ZHI"))
+    parser.add_argument("--padding", help="distance between the chain box and the first wall plane, units of sigma "
+                        "(h/2 in calculate_chain_density.py)", type=float, required=True)
+    parser.add_argument("--axis", help="the axis normal to the walls (default: %(default)s)", choices=sorted(AXES),
+                        default="z")
+    parser.add_argument("--layers", help="number of lattice planes per wall (default: %(default)s)", type=int, default=1)
+    parser.add_argument("--spacing", help="lattice constant of the walls; adjusted in the plane to fit the box "
+                        "(default: %(default)s)", type=float,
+                        default=WALL_SPACING)
+    parser.add_argument("--box-padding", help="space between the outer wall planes and the box (default: %(default)s)",
+                        type=float, default=0.1)
+    parser.add_argument("--atoms-only", help="write only the atom lines instead of a complete data file",
+                        action="store_true")
+    lammps_data.add_output_arguments(parser)
+    args = parser.parse_args()
+    if (args.data is None) == (args.box is None):
+        raise Exception("Give the chain box with either --data or --box")
+
+    box = read_box(args.data) if args.data is not None else lammps_data.Box(*args.box)
+    if box.xlen() == 0. or box.ylen() == 0. or box.zlen() == 0.:
+        raise Exception("No box defined!")
+    lattice = WallLattice(box, AXES[args.axis], args.padding, args.spacing, args.layers)
+    mass = None if args.atoms_only else float(args.mass)
+    out = lammps_data.open_output(args)
+    write_walls(out, lattice, int(args.starting_atom_index), int(args.atom_type), int(args.mol_id), mass,
+                walls_box(box, lattice, args.box_padding))
+    if args.output is not None:
+        out.close()
+
+if __name__ == "__main__":
+    main()
@@ -12,29 +12,155 @@
 # chains and the walls is necessary to make room for the particles that make
 # up the walls. The wall particles are assumed to have a simple cubic unit
 # cell with spacing = 0.8sigma
+#
+# Usage:
+# calculate_chain_density.py <num_atoms> <reduced_density> <padding>
+# calculate_chain_density.py --csv inputs.csv > results.csv
+# calculate_chain_density.py --num-atoms N1 [N2 ...] --reduced-density R1 [R2 ...] --padding P1 [P2 ...]
+# calculate_chain_density.py --solve padding --chain-density D1 [D2 ...] --num-atoms ... --reduced-density ...
+# calculate_chain_density.py --solve num_atoms --chain-density ... --reduced-density ... --padding ...
+# With a CSV file (header row naming the columns) or lists of values, whose
+# combinations are all evaluated, the results are written as CSV with the
+# columns num_atoms, reduced_density, padding and chain_density (the density
+# input to chain.f). With --solve, the given quantity is found instead from a
+# target chain_density and the two other inputs; impossible combinations
+# (a chain density not above the reduced density) give nan.
 
+import sys
 import argparse
-import math
-parser = argparse.ArgumentParser()
-parser.add_argument("num_atoms", help="the number of chain atoms")
-parser.add_argument("reduced_density", help="the desired reduced density of the chains only (L-J units, with sigma=1 assumed)")
-parser.add_argument("padding", help="the extra amount of space on both sides of the chains in the direction normal to the confinement plane (h/2 on each side), units of sigma, with sigma=1 assumed")
-args = parser.parse_args()
-
-n = float(args.num_atoms)
-rhostar = float(args.reduced_density)
-padding = float(args.padding)
-
-def alpha(n, rhostar, padding):
+import numpy as np
+
+COLUMNS = ["num_atoms", "reduced_density", "padding", "chain_density"]
+
+def radical(n, rhostar, padding):
+    return 27. * padding**6. * n**4. * rhostar**8. - 4. * padding**9. * n**3. * rhostar**9.
+
+def alpha(n, rhostar, padding, rad):
     one = 9. * padding**3. * n**2. * rhostar**4.
-    radical = 27. * padding**6. * n**4. * rhostar**8. - 4. * padding**9. * n**3. * rhostar**9.
-    two = math.sqrt(3.) * math.sqrt(radical)
+    two = np.sqrt(3.) * np.sqrt(rad)
     return one + two
 
-def adjusted_density(n, rhostar, padding):
-    al = alpha(n, rhostar, padding)**(1./3.)
+def density_terms(n, rhostar, padding, rad):
+    al = alpha(n, rhostar, padding, rad)**(1./3.)
     one = al * 2.**(-1./3.) * 3.**(-2./3.) * 1./n
     two = (2./3.)**(1./3.) * padding**3. * rhostar**3. * 1./al
-    return one + two + rhostar
+    return one + two
+
+def adjusted_density(n, rhostar, padding):
+    '''
+    The density input to chain.f; the arguments may be NumPy arrays
+    '''
+    n, rhostar, padding = np.broadcast_arrays(*[np.asarray(value, dtype=float) for value in [n, rhostar, padding]])
+    rad = radical(n, rhostar, padding)
+    density = rhostar.copy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        real = (padding != 0.) & (rad >= 0.)
+        density[real] = density_terms(n[real], rhostar[real], padding[real], rad[real]) + rhostar[real]
+        # the radical is negative for large padding, where the cubic has three
+        # real roots: take the complex roots there, the result is still real
+        roots = (padding != 0.) & (rad < 0.)
+        density[roots] = np.real(density_terms(n[roots], rhostar[roots], padding[roots], rad[roots] + 0j)) + \
+            rhostar[roots]
+    return density
+
+def box_length(n, chain_density):
+    # edge of the cubic box chain.f fills
+    return (n / chain_density)**(1./3.)
+
+def solve_padding(n, rhostar, chain_density):
+    '''
+    The padding for which adjusted_density gives chain_density
+    '''
+    length = box_length(n, chain_density)
+    padding = n / (rhostar * length**2.) - length
+    return np.where(padding >= 0., padding, np.nan)
+
+def solve_num_atoms(rhostar, padding, chain_density):
+    '''
+    The number of chain atoms for which adjusted_density gives chain_density;
+    from rhostar = n / (L^2 (L + padding)) with n = chain_density L^3
+    '''
+    with np.errstate(invalid='ignore', divide='ignore'):
+        length = rhostar * padding / (chain_density - rhostar)
+    return np.where(chain_density > rhostar, chain_density * length**3., np.nan)
+
+def read_csv(path, names):
+    '''
+    The named columns of a CSV file with a header row, as float arrays
+    '''
+    table = np.genfromtxt(sys.stdin if path == "-" else path, delimiter=',', names=True, dtype=float, ndmin=1)
+    for name in names:
+        if name not in table.dtype.names:
+            raise Exception("The CSV file has no {0:s} column".format(name))
+    return {name: table[name] for name in names}
+
+def grid(values):
+    '''
+    All combinations of the value lists in a dict, as flat arrays
+    '''
+    names = list(values)
+    grids = np.meshgrid(*[np.asarray(values[name], dtype=float) for name in names], indexing='ij')
+    return {name: g.ravel() for name, g in zip(names, grids)}
+
+def evaluate(columns, solve="chain_density"):
+    '''
+    Fill in the solve column from the three others
+    '''
+    columns = dict(columns)
+    if solve == "chain_density":
+        columns[solve] = adjusted_density(columns["num_atoms"], columns["reduced_density"], columns["padding"])
+    elif solve == "padding":
+        columns[solve] = solve_padding(columns["num_atoms"], columns["reduced_density"], columns["chain_density"])
+    elif solve == "num_atoms":
+        columns[solve] = solve_num_atoms(columns["reduced_density"], columns["padding"], columns["chain_density"])
+    else:
+        raise Exception("Cannot solve for {0:s}".format(solve))
+    return columns
+
+def write_csv(out, columns):
+    np.savetxt(out, np.column_stack([columns[name] for name in COLUMNS]), fmt="%.10g", delimiter=',',
+               header=",".join(COLUMNS), comments="")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("num_atoms", help="the number of chain atoms", nargs="?")
+    parser.add_argument("reduced_density", help="the desired reduced density of the chains only (L-J units, with sigma=1 assumed)", nargs="?")
+    parser.add_argument("padding", help="the extra amount of space on both sides of the chains in the direction normal to the confinement plane (h/2 on each side), units of sigma, with sigma=1 assumed", nargs="?")
+    parser.add_argument("--csv", help="read the inputs from the columns of this CSV file ('-' for stdin)", type=str)
+    parser.add_argument("--num-atoms", help="values of num_atoms to combine", type=float, nargs="+",
+                        dest="num_atoms_list")
+    parser.add_argument("--reduced-density", help="values of reduced_density to combine", type=float, nargs="+",
+                        dest="reduced_density_list")
+    parser.add_argument("--padding", help="values of padding to combine", type=float, nargs="+",
+                        dest="padding_list")
+    parser.add_argument("--chain-density", help="target chain.f densities to combine, with --solve", type=float,
+                        nargs="+")
+    parser.add_argument("--solve", help="find this quantity from a target chain_density instead "
+                        "(default: chain_density)", choices=["chain_density", "padding", "num_atoms"],
+                        default="chain_density")
+    args = parser.parse_args()
+
+    if args.num_atoms is not None:
+        if args.reduced_density is None or args.padding is None:
+            parser.error("num_atoms, reduced_density and padding are needed together")
+        n = float(args.num_atoms)
+        rhostar = float(args.reduced_density)
+        padding = float(args.padding)
+
+        print(float(adjusted_density(n, rhostar, padding)))
+        return
+
+    names = [name for name in COLUMNS if name != args.solve]
+    if args.csv is not None:
+        columns = read_csv(args.csv, names)
+    else:
+        values = {"num_atoms": args.num_atoms_list, "reduced_density": args.reduced_density_list,
+                  "padding": args.padding_list, "chain_density": args.chain_density}
+        for name in names:
+            if values[name] is None:
+                parser.error("--{0:s} is needed".format(name.replace("_", "-")))
+        columns = grid({name: values[name] for name in names})
+    write_csv(sys.stdout, evaluate(columns, args.solve))
 
-print(adjusted_density(n, rhostar, padding))
+if __name__ == "__main__":
+    main()
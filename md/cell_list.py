@@ -0,0 +1,84 @@
+# Periodic cell-list (linked-cell) search for atom pairs closer than a cutoff.
+#
+# The box is divided into cells at least one cutoff wide and the atoms are
+# sorted by cell, so that each cell's atoms are a contiguous slice. Every atom
+# is then compared, with array operations over all atoms at once, against the
+# atoms of its own and the neighbouring cells: one pass per neighbour cell
+# offset and per slot of the most populated cell. The work is O(N) for a
+# homogeneous system; no N x N distance matrix is ever formed.
+
+import itertools
+import numpy as np
+import lammps_data
+
+def cell_offsets(ncell):
+    '''
+    The distinct neighbour cell offsets along one axis with ncell cells
+    '''
+    if ncell >= 3:
+        return [-1, 0, 1]
+    if ncell == 2:
+        return [0, 1]
+    return [0]
+
+def close_pairs(pos, box, cutoff):
+    '''
+    Return (i, j, distance) arrays for every pair of rows of pos that are
+    closer than cutoff under the minimum image convention, each pair once
+    with i < j
+    '''
+    lengths = box.lengths()
+    if np.any(cutoff > lengths / 2.):
+        raise Exception("The cutoff {0:g} must not exceed half the box length".format(cutoff))
+    ncell = np.maximum(np.floor(lengths / cutoff).astype(np.int64), 1)
+    wrapped = np.mod(pos - box.lower(), lengths)
+    cell3 = np.minimum((wrapped * (ncell / lengths)).astype(np.int64), ncell - 1)
+    cell = (cell3[:, 0] * ncell[1] + cell3[:, 1]) * ncell[2] + cell3[:, 2]
+
+    # sort the atoms by cell; a cell's atoms are then sorted[starts:starts+counts]
+    order = np.argsort(cell, kind='stable')
+    cell3 = cell3[order]
+    wrapped = wrapped[order]
+    counts = np.bincount(cell[order], minlength=int(np.prod(ncell)))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    cutoff2 = cutoff * cutoff
+    index = np.arange(pos.shape[0])
+
+    found_i, found_j, found_d = [], [], []
+    for offset in itertools.product(*[cell_offsets(n) for n in ncell]):
+        neighbor3 = np.mod(cell3 + np.array(offset), ncell)
+        neighbor = (neighbor3[:, 0] * ncell[1] + neighbor3[:, 1]) * ncell[2] + neighbor3[:, 2]
+        first = starts[neighbor]
+        count = counts[neighbor]
+        active = index
+        for slot in range(int(count.max()) if count.size else 0):
+            # only atoms whose neighbour cell holds more than slot atoms
+            active = active[count[active] > slot]
+            j = first[active] + slot
+            # every unordered pair is visited from both sides; keep one
+            keep = j > active
+            i = active[keep]
+            j = j[keep]
+            dist = wrapped[j] - wrapped[i]
+            lammps_data.minimum_image(dist, lengths)
+            d2 = np.einsum('ij,ij->i', dist, dist)
+            close = d2 < cutoff2
+            found_i.append(i[close])
+            found_j.append(j[close])
+            found_d.append(np.sqrt(d2[close]))
+
+    if not found_i:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    i = order[np.concatenate(found_i)]
+    j = order[np.concatenate(found_j)]
+    swap = i > j
+    i[swap], j[swap] = j[swap], i[swap]
+    return i, j, np.concatenate(found_d)
+
+def pair_keys(ids_1, ids_2, max_id):
+    '''
+    A single integer per unordered pair of atom ids
+    '''
+    lo = np.minimum(ids_1, ids_2)
+    hi = np.maximum(ids_1, ids_2)
+    return lo * (max_id + 1) + hi
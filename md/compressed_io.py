@@ -0,0 +1,234 @@
+# Transparent compression of the files read and written by the md tools.
+#
+# Inputs compressed with gzip, bzip2 or xz are recognised by their first
+# bytes, so a compressed data or dump file can be given wherever one is read,
+# on stdin as well; outputs are compressed when their name ends in .gz, .bz2
+# or .xz. The (de)compressors are wrapped in large buffers. With threaded set,
+# a helper thread decompresses the input ahead of the parser, or compresses
+# the output behind the writer, in blocks; zlib, bz2 and lzma release the GIL
+# while they work, so both sides run at the same time. Usage:
+#
+#   import compressed_io
+#   with compressed_io.open_input("data.in.gz", threaded=True) as infile:
+#       data = lammps_data.read_data(infile)
+
+import io
+import sys
+import bz2
+import gzip
+import lzma
+import queue
+import threading
+
+# bytes moved between the (de)compressor and the text layer at once
+BUFFER_SIZE = 1 << 20
+
+# number of blocks a helper thread may run ahead of the main thread
+QUEUE_BLOCKS = 8
+
+# gzip's own default; level 9 is several times slower for a few per cent
+GZIP_LEVEL = 6
+
+# name, leading bytes, file name suffix
+FORMATS = [("gzip", b"\x1f\x8b", ".gz"),
+           ("bzip2", b"BZh", ".bz2"),
+           ("xz", b"\xfd7zXZ\x00", ".xz")]
+
+def format_of_bytes(head):
+    for name, magic, suffix in FORMATS:
+        if head.startswith(magic):
+            return name
+    return None
+
+def format_of_name(path):
+    for name, magic, suffix in FORMATS:
+        if path.endswith(suffix):
+            return name
+    return None
+
+def compression(path):
+    '''
+    The compression format of the file at path, or None if it is plain
+    '''
+    with open(path, 'rb') as f:
+        return format_of_bytes(f.read(6))
+
+def open_binary(name, target, mode):
+    # target is a file name or a binary file object
+    if name == "gzip":
+        if isinstance(target, str):
+            return gzip.GzipFile(target, mode, compresslevel=GZIP_LEVEL)
+        return gzip.GzipFile(fileobj=target, mode=mode, compresslevel=GZIP_LEVEL)
+    if name == "bzip2":
+        return bz2.BZ2File(target, mode)
+    return lzma.LZMAFile(target, mode)
+
+class ReadAhead(io.RawIOBase):
+    '''
+    Reads a binary stream in a helper thread, up to QUEUE_BLOCKS blocks ahead
+    '''
+    def __init__(self, stream, block_size=BUFFER_SIZE):
+        self.stream = stream
+        self.block_size = block_size
+        self.start()
+
+    def start(self):
+        self.blocks = queue.Queue(QUEUE_BLOCKS)
+        self.stopping = threading.Event()
+        self.pending = memoryview(b"")
+        self.position = 0
+        self.eof = False
+        self.thread = threading.Thread(target=self.fill, daemon=True)
+        self.thread.start()
+
+    def fill(self):
+        try:
+            while not self.stopping.is_set():
+                block = self.stream.read(self.block_size)
+                self.put(block)
+                if not block:
+                    return
+        except BaseException as error:
+            # raised again in the main thread
+            self.put(error)
+
+    def put(self, item):
+        # give up once the main thread stops reading
+        while not self.stopping.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def stop(self):
+        self.stopping.set()
+        self.thread.join()
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if not self.pending:
+            if self.eof:
+                return 0
+            block = self.blocks.get()
+            if isinstance(block, BaseException):
+                raise block
+            if not block:
+                self.eof = True
+                return 0
+            self.pending = memoryview(block)
+        n = min(len(b), len(self.pending))
+        b[:n] = self.pending[:n]
+        self.pending = self.pending[n:]
+        self.position += n
+        return n
+
+    def seekable(self):
+        return self.stream.seekable()
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # only rewinding is supported, as used by the two-pass streaming modes
+        if offset != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("a read-ahead stream can only be rewound")
+        self.stop()
+        self.stream.seek(0)
+        self.start()
+        return 0
+
+    def close(self):
+        if not self.closed:
+            self.stop()
+            self.stream.close()
+        super().close()
+
+class WriteBehind(io.RawIOBase):
+    '''
+    Writes to a binary stream from a helper thread, up to QUEUE_BLOCKS blocks
+    behind
+    '''
+    def __init__(self, stream):
+        self.stream = stream
+        self.blocks = queue.Queue(QUEUE_BLOCKS)
+        self.error = None
+        self.thread = threading.Thread(target=self.drain, daemon=True)
+        self.thread.start()
+
+    def drain(self):
+        while True:
+            block = self.blocks.get()
+            try:
+                if block is None:
+                    return
+                if self.error is None:
+                    self.stream.write(block)
+            except BaseException as error:
+                # raised again in the main thread
+                self.error = error
+            finally:
+                self.blocks.task_done()
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.check()
+        self.blocks.put(bytes(b))
+        return len(b)
+
+    def flush(self):
+        if not self.closed:
+            self.blocks.join()
+            self.check()
+            self.stream.flush()
+
+    def close(self):
+        if not self.closed:
+            # flushes what is queued
+            super().close()
+            self.blocks.put(None)
+            self.thread.join()
+            self.stream.close()
+            self.check()
+
+def open_input(path=None, threaded=False):
+    '''
+    Text stream of the file at path, or of stdin if path is None or "-",
+    decompressed if it is compressed
+    '''
+    if path is None or path == "-":
+        name = format_of_bytes(sys.stdin.buffer.peek(6)[:6])
+        if name is None:
+            return sys.stdin
+        binary = open_binary(name, sys.stdin.buffer, 'rb')
+    else:
+        name = compression(path)
+        if name is None:
+            return open(path, buffering=BUFFER_SIZE)
+        binary = open_binary(name, path, 'rb')
+    if threaded:
+        binary = ReadAhead(binary)
+    return io.TextIOWrapper(io.BufferedReader(binary, BUFFER_SIZE))
+
+def open_output(path=None, threaded=False):
+    '''
+    Text stream writing to the file at path, or stdout if path is None or
+    "-"; compressed if the name of the file ends in .gz, .bz2 or .xz
+    '''
+    if path is None or path == "-":
+        return sys.stdout
+    name = format_of_name(path)
+    if name is None:
+        return open(path, "w", buffering=BUFFER_SIZE)
+    binary = open_binary(name, path, 'wb')
+    if threaded:
+        binary = WriteBehind(binary)
+    return io.TextIOWrapper(io.BufferedWriter(binary, BUFFER_SIZE))
@@ -0,0 +1,161 @@
+# Opt-in binary cache of parsed LAMMPS data files.
+#
+# The parsed atom and bond arrays are stored as .npy files in a ".lmpcache"
+# directory next to the input file, together with the raw text sections, and
+# are memory-mapped (copy-on-write) by later runs instead of re-parsing the
+# text. Entries are named by a hash of the file contents; a small index maps
+# each input file name to its size, mtime and hash so that an unchanged file is
+# not even re-hashed. The least recently used entries are evicted once the
+# cache directory grows beyond a size limit.
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import lammps_data
+
+CACHE_DIR = ".lmpcache"
+CACHE_VERSION = 1
+INDEX_FILE = "index.json"
+META_FILE = "meta.json"
+
+# default size limit of a cache directory
+DEFAULT_MAX_BYTES = 4 << 30
+
+def content_hash(path, block_size=1 << 23):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_json(path, obj):
+    # write to a temporary file first so that readers never see a partial file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(obj, f)
+        os.replace(tmp, path)
+    except OSError:
+        os.unlink(tmp)
+        raise
+
+def entry_size(entry):
+    size = 0
+    for name in os.listdir(entry):
+        size += os.path.getsize(os.path.join(entry, name))
+    return size
+
+def evict(cache_dir, max_bytes, keep=None):
+    '''
+    Remove the least recently used entries until the cache fits in max_bytes
+    '''
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.startswith(".tmp"):
+            continue
+        entry = os.path.join(cache_dir, name)
+        meta = os.path.join(entry, META_FILE)
+        if not os.path.isfile(meta):
+            continue
+        entries.append((os.path.getmtime(meta), entry_size(entry), entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        if entry == keep:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+def store(entry, data, st):
+    tmp = tempfile.mkdtemp(dir=os.path.dirname(entry), prefix=".tmp")
+    np.save(os.path.join(tmp, "atoms.npy"), data.atoms)
+    np.save(os.path.join(tmp, "bonds.npy"), data.bonds)
+    meta = {"version": CACHE_VERSION, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "preamble": data.preamble, "other": data.other, "rest": data.rest}
+    with open(os.path.join(tmp, META_FILE), 'w') as f:
+        json.dump(meta, f)
+    try:
+        os.rename(tmp, entry)
+    except OSError:
+        # another process stored the same entry first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def restore(entry):
+    meta = read_json(os.path.join(entry, META_FILE))
+    if meta is None or meta.get("version") != CACHE_VERSION:
+        return None
+    data = lammps_data.DataFile()
+    data.preamble = meta["preamble"]
+    data.other = meta["other"]
+    data.rest = meta["rest"]
+    for line in data.preamble:
+        lammps_data.parse_box_line(data.box, line)
+    # copy-on-write: the tools may modify the arrays without touching the cache
+    data.atoms = np.load(os.path.join(entry, "atoms.npy"), mmap_mode='c')
+    data.bonds = np.load(os.path.join(entry, "bonds.npy"), mmap_mode='c')
+    # mark the entry as recently used
+    try:
+        os.utime(os.path.join(entry, META_FILE))
+    except OSError:
+        pass
+    return data
+
+def load(path, max_bytes=DEFAULT_MAX_BYTES, workers=1):
+    '''
+    Return the parsed data file at path, from the cache if possible
+    '''
+    path = os.path.abspath(path)
+    cache_dir = os.path.join(os.path.dirname(path), CACHE_DIR)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        # e.g. a read-only or foreign-owned directory: parse without the cache
+        return lammps_data.read_file(path, workers)
+    st = os.stat(path)
+    writable = True
+
+    # only re-hash the file if its size or mtime changed
+    index_path = os.path.join(cache_dir, INDEX_FILE)
+    index = read_json(index_path) or {}
+    known = index.get(os.path.basename(path))
+    if known is not None and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+        digest = known["hash"]
+    else:
+        digest = content_hash(path)
+        index[os.path.basename(path)] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                                         "hash": digest}
+        try:
+            write_json(index_path, index)
+        except OSError:
+            # an existing entry can still be used, but nothing is stored
+            writable = False
+
+    entry = os.path.join(cache_dir, digest)
+    if os.path.isdir(entry):
+        data = restore(entry)
+        if data is not None:
+            return data
+        shutil.rmtree(entry, ignore_errors=True)
+
+    data = lammps_data.read_file(path, workers)
+    if writable:
+        try:
+            store(entry, data, st)
+            evict(cache_dir, max_bytes, keep=entry)
+        except OSError:
+            pass
+    return data
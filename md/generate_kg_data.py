@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+# Usage:
+# generate_kg_data.py -n <num_atoms> [--chain-length 100] [--density 0.85] [--seed 1] > data.in
+# generate_kg_data.py -n <num_atoms> --xyz > data.xyz
+# Write a synthetic Kremer-Grest melt as a LAMMPS data file (bond atom style):
+# linear chains of freely jointed bonds of length 0.97 sigma, started at random
+# points of a cubic box sized for the density, wrapped into the box with image
+# flags and shifted by a random number of box lengths per chain, so that image
+# flags of all sizes occur. The chains are generated and written in blocks, so
+# files of 10^8 atoms need little memory. With --xyz, the wrapped positions are
+# written as an XYZ file instead (input for xyz2lmpbond.py). The output is the
+# same for the same arguments.
+
+import argparse
+import numpy as np
+import lammps_data
+from lammps_data import Section
+
+# KG bond length, in sigma
+BOND_LENGTH = 0.97
+
+# largest image offset given to a chain
+MAX_IMAGE = 2
+
+class Melt:
+    def __init__(self, num_atoms, chain_length=100, density=0.85, seed=1, bond_length=BOND_LENGTH):
+        self.chain_length = chain_length
+        self.num_chains = max(num_atoms // chain_length, 1)
+        self.num_atoms = self.num_chains * chain_length
+        self.num_bonds = self.num_chains * (chain_length - 1)
+        length = (self.num_atoms / density)**(1./3.)
+        self.box = lammps_data.Box(0., length, 0., length, 0., length)
+        self.seed = seed
+        self.bond_length = bond_length
+        # chains per block
+        self.block = max(lammps_data.WRITE_CHUNK // chain_length, 1)
+
+    def atom_blocks(self, shuffle=False):
+        '''
+        Yield structured atom arrays of whole chains, in order of atom id
+        unless shuffle is set (then shuffled within each block)
+        '''
+        rng = np.random.default_rng(self.seed)
+        lengths = self.box.lengths()
+        for first in range(0, self.num_chains, self.block):
+            num_chains = min(self.block, self.num_chains - first)
+            steps = rng.normal(size=(num_chains, self.chain_length, 3))
+            steps *= self.bond_length / np.linalg.norm(steps, axis=2, keepdims=True)
+            steps[:, 0] = rng.uniform(size=(num_chains, 3)) * lengths
+            pos = np.cumsum(steps, axis=1)
+            pos += rng.integers(-MAX_IMAGE, MAX_IMAGE + 1, size=(num_chains, 1, 3)) * lengths
+            pos = pos.reshape(-1, 3)
+            image = np.floor(pos / lengths)
+            pos -= image * lengths
+
+            atoms = np.zeros(pos.shape[0], dtype=lammps_data.ATOM_DTYPE)
+            atoms['id'] = np.arange(first * self.chain_length + 1, (first + num_chains) * self.chain_length + 1)
+            atoms['mol'] = np.repeat(np.arange(first + 1, first + num_chains + 1), self.chain_length)
+            atoms['type'] = 1
+            atoms['pos'] = pos
+            atoms['image'] = image
+            if shuffle:
+                rng.shuffle(atoms)
+            yield atoms
+
+    def bond_blocks(self):
+        '''
+        Yield structured bond arrays of whole chains, in order of bond id
+        '''
+        per_chain = self.chain_length - 1
+        for first in range(0, self.num_chains, self.block):
+            num_chains = min(self.block, self.num_chains - first)
+            starts = np.repeat(np.arange(first, first + num_chains) * self.chain_length + 1, per_chain)
+            bonds = np.zeros(num_chains * per_chain, dtype=lammps_data.BOND_DTYPE)
+            bonds['id'] = np.arange(first * per_chain + 1, (first + num_chains) * per_chain + 1)
+            bonds['type'] = 1
+            bonds['atom_1'] = starts + np.tile(np.arange(per_chain), num_chains)
+            bonds['atom_2'] = bonds['atom_1'] + 1
+            yield bonds
+
+    def preamble(self):
+        return ["LAMMPS data file via generate_kg_data.py, seed {0:d}".format(self.seed), "",
+                "{0:d} atoms".format(self.num_atoms), "{0:d} bonds".format(self.num_bonds), "",
+                "1 atom types", "1 bond types", "", str(self.box), "", "Masses", "", "1 1.0", ""]
+
+def write_data(melt, out, shuffle=False):
+    writer = lammps_data.DataWriter(out)
+    writer.lines(Section.preamble, melt.preamble())
+    for atoms in melt.atom_blocks(shuffle):
+        writer.atoms(atoms)
+    for bonds in melt.bond_blocks():
+        writer.bonds(bonds)
+    writer.close()
+
+def write_xyz(melt, out):
+    out.write("{0:d}\nKremer-Grest melt via generate_kg_data.py, seed {1:d}\n".format(melt.num_atoms, melt.seed))
+    for atoms in melt.atom_blocks():
+        pos = atoms['pos']
+        lammps_data.write_records(out, "C %f %f %f", [pos[:, 0], pos[:, 1], pos[:, 2]])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num-atoms", help="number of atoms, rounded down to whole chains (e.g. 1e6)",
+                        type=lambda value: int(float(value)), required=True)
+    parser.add_argument("--chain-length", help="atoms per chain (default: %(default)s)", type=int, default=100)
+    parser.add_argument("--density", help="reduced number density (default: %(default)s)", type=float, default=0.85)
+    parser.add_argument("--seed", help="random seed (default: %(default)s)", type=int, default=1)
+    parser.add_argument("--shuffle", help="write the atoms of each block in random order", action="store_true")
+    parser.add_argument("--xyz", help="write an XYZ file of the wrapped positions instead", action="store_true")
+    lammps_data.add_output_arguments(parser)
+    parser.add_argument("--io-thread", help="compress the output in a helper thread", action="store_true")
+    args = parser.parse_args()
+    if args.chain_length < 2:
+        raise Exception("Chains need at least 2 atoms")
+
+    melt = Melt(args.num_atoms, args.chain_length, args.density, args.seed)
+    out = lammps_data.open_output(args)
+    if args.xyz:
+        write_xyz(melt, out)
+    else:
+        write_data(melt, out, args.shuffle)
+    if args.output is not None:
+        out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+# Shared reader for LAMMPS data files that use the 'bond' atom style
+# (Kremer-Grest systems), as used by the scripts in this directory.
+#
+# The Atoms and Bonds sections are parsed straight into structured NumPy
+# arrays; every other line is kept as raw text so that it can be copied to the
+# output unchanged. Compressed files are read and written through
+# compressed_io (see add_input_arguments and add_output_arguments). Usage:
+#
+#   import lammps_data
+#   data = lammps_data.read_data(sys.stdin)
+#   rows = data.atom_rows(data.bonds['atom_1'])
+
+import os
+from enum import Enum
+import numpy as np
+import timings
+import compressed_io
+
+# one record per atom line: atom-ID molecule-ID atom-type x y z nx ny nz
+ATOM_DTYPE = np.dtype([('id', np.int64),
+                       ('mol', np.int64),
+                       ('type', np.int32),
+                       ('pos', np.float64, (3,)),
+                       ('image', np.int32, (3,))])
+
+# one record per bond line: bond-ID bond-type atom-1 atom-2
+BOND_DTYPE = np.dtype([('id', np.int64),
+                       ('type', np.int32),
+                       ('atom_1', np.int64),
+                       ('atom_2', np.int64)])
+
+ATOM_COLUMNS = 9
+BOND_COLUMNS = 4
+
+ATOM_FORMAT = "%d %d %d %f %f %f %d %d %d"
+BOND_FORMAT = "%d %d %d %d"
+# the fixed-width atom format used by xyz2lmpbond.py
+PADDED_ATOM_FORMAT = "%10d %7d %7d %9.4f %9.4f %9.4f %3d %3d %3d"
+
+# number of record lines converted to numbers at once
+PARSE_CHUNK = 1 << 20
+# number of record lines held at once by the streaming modes
+STREAM_CHUNK = 1 << 16
+
+# number of records formatted into one buffer by the bulk writer
+WRITE_CHUNK = 1 << 16
+
+# setting this environment variable turns on the parsed data cache by default
+CACHE_ENV = "MD_DATA_CACHE"
+
+class Section(Enum):
+    preamble = 1
+    atoms = 2
+    other = 3
+    bonds = 4
+    rest = 5
+
+class Box:
+    def __init__(self, xlo, xhi, ylo, yhi, zlo, zhi):
+        self.dim = [[0., 0.], [0., 0.], [0., 0.]]
+        self.dim[0][0] = xlo
+        self.dim[0][1] = xhi
+        self.dim[1][0] = ylo
+        self.dim[1][1] = yhi
+        self.dim[2][0] = zlo
+        self.dim[2][1] = zhi
+    def xlen(self):
+        return self.length(0)
+    def ylen(self):
+        return self.length(1)
+    def zlen(self):
+        return self.length(2)
+    def length(self, dimension):
+        return self.dim[dimension][1] - self.dim[dimension][0]
+    def lengths(self):
+        return np.array([self.length(ax) for ax in [0, 1, 2]])
+    def lower(self):
+        return np.array([self.dim[ax][0] for ax in [0, 1, 2]])
+    def __str__(self):
+        return "{0:9f} {1:9f} xlo xhi\n{2:9f} {3:9f} ylo yhi\n{4:9f} {5:9f} zlo zhi".format(self.dim[0][0],
+                                                                                            self.dim[0][1],
+                                                                                            self.dim[1][0],
+                                                                                            self.dim[1][1],
+                                                                                            self.dim[2][0],
+                                                                                            self.dim[2][1])
+
+def unwrapped_positions(atoms, box):
+    '''
+    Positions with the image flags applied: pos + image * box length
+    '''
+    return atoms['pos'] + atoms['image'] * box.lengths()
+
+def minimum_image(distance, lengths):
+    '''
+    If image flags are inconsistent, it may appear that some bonds are longer
+    than they are in reality. This is because one of the participating atoms
+    does not appear in the data file with the correct image flag from the point
+    of view of the bond. The real atom that actually participates in the bond in
+    this case is an image of the atom listed in the data file. The image flag
+    is set to the value in the data file to keep track of the original atoms, and
+    therefore the center of mass of the system. LAMMPS performs this same
+    procedure to correctly calculate the bond lengths in Domain::minimum_image
+
+    distance is an (n, 3) array of separation vectors and is wrapped in place
+    so that every component lies within half a box length. A box length is
+    added or subtracted one at a time, as LAMMPS does, so that the result is
+    the same to the last bit; only the components still out of range are
+    touched in each round.
+    '''
+    half = lengths / 2.
+    for ax in range(3):
+        column = distance[:, ax]
+        rows = np.flatnonzero(np.abs(column) > half[ax])
+        while rows.size:
+            values = column[rows]
+            values -= np.where(values < 0., -lengths[ax], lengths[ax])
+            column[rows] = values
+            rows = rows[np.abs(values) > half[ax]]
+    return distance
+
+def find_section(line, section):
+    if line[:(len(section))] == section:
+        return True
+    return False
+
+def box_axis(line):
+    '''
+    Return the axis described by a "lo hi xlo xhi" style header line, or None
+    '''
+    for ax, key in enumerate(["xhi", "yhi", "zhi"]):
+        if key in line:
+            return ax
+    return None
+
+def parse_box_line(box, line):
+    '''
+    Update box from a header line; returns True if the line was a box line
+    '''
+    ax = box_axis(line)
+    if ax is None:
+        return False
+    linesp = line.split()
+    box.dim[ax][0] = float(linesp[0])
+    box.dim[ax][1] = float(linesp[1])
+    return True
+
+def parse_records(text, num_lines, ncols, dtype, what):
+    '''
+    Convert a block of num_lines whitespace-separated record lines into a
+    structured array of the given dtype
+    '''
+    values = np.fromstring(text, dtype=np.float64, sep=' ') if num_lines else np.empty(0)
+    if values.size != num_lines * ncols:
+        # find the offending line to produce a useful message
+        for line in text.splitlines():
+            contents = line.split()
+            if len(contents) != ncols:
+                raise Exception("{0:s} line is expected to have {1:d} values: {2:d} found."
+                                "\nLine was: {3:s}".format(what, ncols, len(contents), line))
+            for value in contents:
+                float(value)
+        raise Exception("Could not parse {0:s} records".format(what))
+    values = values.reshape(num_lines, ncols)
+    records = np.empty(num_lines, dtype=dtype)
+    if dtype == ATOM_DTYPE:
+        records['id'] = values[:, 0]
+        records['mol'] = values[:, 1]
+        records['type'] = values[:, 2]
+        records['pos'] = values[:, 3:6]
+        records['image'] = values[:, 6:9]
+    else:
+        records['id'] = values[:, 0]
+        records['type'] = values[:, 1]
+        records['atom_1'] = values[:, 2]
+        records['atom_2'] = values[:, 3]
+    return records
+
+def parse_atoms(text, num_lines):
+    return parse_records(text, num_lines, ATOM_COLUMNS, ATOM_DTYPE, "An atom")
+
+def parse_bonds(text, num_lines):
+    return parse_records(text, num_lines, BOND_COLUMNS, BOND_DTYPE, "A bond")
+
+class AtomIndex:
+    '''
+    Maps atom ids to rows of the atoms array. Compact id ranges use a dense
+    lookup table, sparse ones fall back to a binary search.
+    '''
+    def __init__(self, ids):
+        self.lookup = None
+        self.order = None
+        self.sorted_ids = None
+        if ids.size > 0 and ids.min() >= 0 and ids.max() <= 4 * ids.size + 1024:
+            self.lookup = np.full(ids.max() + 1, -1, dtype=np.int64)
+            self.lookup[ids] = np.arange(ids.size)
+        else:
+            self.order = np.argsort(ids, kind='stable')
+            self.sorted_ids = ids[self.order]
+
+    def rows(self, ids):
+        ids = np.asarray(ids)
+        if self.lookup is not None:
+            valid = (ids >= 0) & (ids < self.lookup.size)
+            rows = np.full(ids.shape, -1, dtype=np.int64)
+            rows[valid] = self.lookup[ids[valid]]
+        else:
+            rows = np.full(ids.shape, -1, dtype=np.int64)
+            if self.sorted_ids.size:
+                pos = np.minimum(np.searchsorted(self.sorted_ids, ids), self.sorted_ids.size - 1)
+                found = self.sorted_ids[pos] == ids
+                rows[found] = self.order[pos[found]]
+        if np.any(rows < 0):
+            missing = ids[rows < 0].ravel()[0]
+            raise Exception("Atom {0:d} is referenced but not defined in the Atoms section".format(int(missing)))
+        return rows
+
+class DataFile:
+    def __init__(self):
+        self.preamble = [] # raw lines before the Atoms section, including the box lines
+        self.other = []    # raw lines between the Atoms and the Bonds sections
+        self.rest = []     # raw lines after the Bonds section
+        self.box = Box(0., 0., 0., 0., 0., 0.)
+        self.atoms = np.empty(0, dtype=ATOM_DTYPE) # in order in which they were read
+        self.bonds = np.empty(0, dtype=BOND_DTYPE) # in order in which they were read
+        self._index = None
+
+    def index(self):
+        if self._index is None:
+            self._index = AtomIndex(self.atoms['id'])
+        return self._index
+
+    def atom_rows(self, ids):
+        return self.index().rows(ids)
+
+def iter_data(stream, chunk=PARSE_CHUNK):
+    '''
+    Walk a LAMMPS data file given as an iterable of lines and yield
+    (section, item) pairs in file order: raw lines for the preamble, other
+    and rest sections, and record arrays of up to chunk rows for the Atoms and
+    Bonds sections. The section headers and the blank lines that delimit the
+    record sections are not yielded.
+    '''
+    section = Section.preamble
+    pending = []
+    found_records = False
+    parsers = {Section.atoms: parse_atoms, Section.bonds: parse_bonds}
+
+    for line in stream:
+        if section == Section.preamble:
+            # look for the Atoms section
+            if not find_section(line, "Atoms"):
+                yield section, line
+            else:
+                section = Section.atoms
+                found_records = False
+
+        elif section == Section.atoms or section == Section.bonds:
+            # collect the records and look for the end of the section
+            if line == "\n":
+                if found_records:
+                    if pending:
+                        yield section, parsers[section](''.join(pending), len(pending))
+                        del pending[:]
+                    section = Section.other if section == Section.atoms else Section.rest
+            else:
+                found_records = True
+                pending.append(line)
+                if len(pending) == chunk:
+                    yield section, parsers[section](''.join(pending), len(pending))
+                    del pending[:]
+
+        elif section == Section.other:
+            # look for the Bonds section
+            if not find_section(line, "Bonds"):
+                yield section, line
+            else:
+                section = Section.bonds
+                found_records = False
+
+        else:
+            yield section, line
+
+    if pending:
+        yield section, parsers[section](''.join(pending), len(pending))
+
+def read_data(stream):
+    '''
+    Read a LAMMPS data file from an iterable of lines (e.g. sys.stdin)
+    '''
+    data = DataFile()
+    blocks = {Section.atoms: [], Section.bonds: []}
+    lines = {Section.preamble: data.preamble, Section.other: data.other, Section.rest: data.rest}
+    items = iter_data(stream)
+    if timings.current is not None:
+        items = timings.current.sections(items)
+    for section, item in items:
+        if section in blocks:
+            blocks[section].append(item)
+        else:
+            if section == Section.preamble:
+                parse_box_line(data.box, item)
+            lines[section].append(item)
+    if blocks[Section.atoms]:
+        data.atoms = np.concatenate(blocks[Section.atoms])
+    if blocks[Section.bonds]:
+        data.bonds = np.concatenate(blocks[Section.bonds])
+    return data
+
+def add_input_arguments(parser):
+    '''
+    Add the options shared by the tools that read a data file
+    '''
+    parser.add_argument("-i", "--input", help="read the data file from INPUT instead of stdin; gzip, bzip2 and xz "
+                        "compressed files are recognised", type=str)
+    parser.add_argument("--cache", help="keep a binary copy of the parsed INPUT next to it and use it on later "
+                        "runs (also enabled by setting {0:s})".format(CACHE_ENV), action="store_true")
+    parser.add_argument("--no-cache", help="neither use nor update the cache", action="store_true")
+    parser.add_argument("--cache-size", help="evict old cache entries beyond this many MiB (default: %(default)s)",
+                        type=float, default=4096.)
+    parser.add_argument("-j", "--workers", help="parse INPUT with this many processes (default: %(default)s)",
+                        type=int, default=1)
+    parser.add_argument("--timings", help="report the time, throughput and peak memory of each phase of the run "
+                        "to stderr, or as JSON to TIMINGS", nargs="?", const="-", metavar="TIMINGS")
+    parser.add_argument("--io-thread", help="decompress the input and compress the output in helper threads",
+                        action="store_true")
+
+def add_output_arguments(parser):
+    '''
+    Add the option shared by the tools that write a data file or a report
+    '''
+    parser.add_argument("-o", "--output", help="write to OUTPUT instead of stdout, compressed if it ends in .gz, "
+                        ".bz2 or .xz", type=str)
+
+def open_output(args):
+    '''
+    The stream selected by the options from add_output_arguments; close it
+    when args.output is set
+    '''
+    return compressed_io.open_output(args.output, getattr(args, "io_thread", False))
+
+def cache_enabled(args):
+    return args.input is not None and not args.no_cache and (args.cache or bool(os.environ.get(CACHE_ENV)))
+
+def load_data(args):
+    '''
+    Read the data file selected by the options from add_input_arguments
+    '''
+    timings.configure(args)
+    if args.input is None:
+        return read_data(compressed_io.open_input(None, args.io_thread))
+    if not cache_enabled(args) and args.workers <= 1:
+        return read_file(args.input, threaded=args.io_thread)
+    # the cached and parallel readers are timed as a whole
+    with timings.phase("parse"):
+        if cache_enabled(args):
+            import data_cache
+            data = data_cache.load(args.input, int(args.cache_size * 1048576), args.workers)
+        else:
+            data = read_file(args.input, args.workers, args.io_thread)
+    timings.count("parse", int(data.atoms.size + data.bonds.size))
+    return data
+
+def read_file(path, workers=1, threaded=False):
+    '''
+    Read the data file at path, in parallel if workers > 1 and it is not
+    compressed; threaded decompresses it in a helper thread
+    '''
+    if workers > 1 and compressed_io.compression(path) is None:
+        import parallel_read
+        return parallel_read.read_data(path, workers)
+    with compressed_io.open_input(path, threaded) as infile:
+        return read_data(infile)
+
+def write_lines(out, lines):
+    if lines:
+        out.write("\n".join([line.rstrip() for line in lines]) + "\n")
+
+def atom_columns(atoms):
+    return [atoms['id'], atoms['mol'], atoms['type'],
+            atoms['pos'][:, 0], atoms['pos'][:, 1], atoms['pos'][:, 2],
+            atoms['image'][:, 0], atoms['image'][:, 1], atoms['image'][:, 2]]
+
+def bond_columns(bonds):
+    return [bonds['id'], bonds['type'], bonds['atom_1'], bonds['atom_2']]
+
+def format_records(fmt, columns):
+    '''
+    Format equal-length columns into one string of newline-terminated lines
+    '''
+    rows = zip(*[column.tolist() for column in columns])
+    fmt = fmt + "\n"
+    return "".join([fmt % row for row in rows])
+
+def write_records(out, fmt, columns, chunk=WRITE_CHUNK):
+    '''
+    Write the columns in blocks of chunk records, one write per block
+    '''
+    num_records = len(columns[0]) if columns else 0
+    for start in range(0, num_records, chunk):
+        out.write(format_records(fmt, [column[start:start + chunk] for column in columns]))
+
+class DataWriter:
+    '''
+    Writes the sections of a data file in order while they are streamed in,
+    adding the section headers and delimiters. The preamble is held back until
+    the first atom arrives so that preamble_hook (a function taking and
+    returning the list of preamble lines) can rewrite it.
+    '''
+    def __init__(self, out, preamble_hook=None, atom_format=ATOM_FORMAT):
+        self.out = out
+        self.preamble_hook = preamble_hook
+        self.atom_format = atom_format
+        self.preamble = []
+        self.section = Section.preamble
+
+    def advance(self, section):
+        # emit the headers and delimiters of every section boundary passed
+        while self.section.value < section.value:
+            if self.section == Section.preamble:
+                if self.preamble_hook is not None:
+                    self.preamble = self.preamble_hook(self.preamble)
+                write_lines(self.out, self.preamble)
+                self.out.write("Atoms # bond\n\n")
+            elif self.section == Section.atoms:
+                self.out.write("\n")
+            elif self.section == Section.other:
+                self.out.write("Bonds\n\n")
+            self.section = Section(self.section.value + 1)
+
+    def write(self, section, item):
+        '''
+        Write one (section, item) pair as produced by iter_data
+        '''
+        if section == Section.atoms:
+            self.atoms(item)
+        elif section == Section.bonds:
+            self.bonds(item)
+        else:
+            self.lines(section, [item])
+
+    def lines(self, section, lines):
+        self.advance(section)
+        if section == Section.preamble:
+            self.preamble.extend(lines)
+        else:
+            write_lines(self.out, lines)
+
+    def atoms(self, atoms):
+        self.advance(Section.atoms)
+        write_records(self.out, self.atom_format, atom_columns(atoms))
+
+    def bonds(self, bonds):
+        self.advance(Section.bonds)
+        write_records(self.out, BOND_FORMAT, bond_columns(bonds))
+
+    def close(self):
+        self.advance(Section.rest)
+
+def write_data(data, out):
+    '''
+    Write the sections in order
+    '''
+    with timings.phase("write", int(data.atoms.size + data.bonds.size)):
+        writer = DataWriter(out)
+        writer.lines(Section.preamble, data.preamble)
+        writer.atoms(data.atoms)
+        writer.lines(Section.other, data.other)
+        writer.bonds(data.bonds)
+        writer.lines(Section.rest, data.rest)
+        writer.close()
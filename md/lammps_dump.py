@@ -0,0 +1,112 @@
+# Reader for LAMMPS text dump files (dump style atom/custom), one frame at a
+# time. Usage:
+#
+#   import lammps_dump
+#   for frame in lammps_dump.iter_frames(open("dump.lammpstrj")):
+#       ...frame.timestep, frame.box, frame.ids, frame.positions()...
+#
+# FramePositions matches the atoms of each frame to the atom table of a data
+# file, for measuring the bonds of the data file in every frame.
+
+import itertools
+import numpy as np
+import lammps_data
+
+class Frame:
+    def __init__(self, timestep, box, columns, values):
+        self.timestep = timestep
+        self.box = box
+        self.columns = columns # column names from the ITEM: ATOMS line
+        self.values = values   # (natoms, ncolumns) array
+        self.ids = values[:, columns.index("id")].astype(np.int64)
+
+    def column(self, name):
+        return self.values[:, self.columns.index(name)]
+
+    def has(self, *names):
+        return all(name in self.columns for name in names)
+
+    def positions(self):
+        '''
+        Unwrapped positions of the atoms in this frame, from whichever
+        coordinate columns the dump provides
+        '''
+        lengths = self.box.lengths()
+        lower = self.box.lower()
+        if self.has("xu", "yu", "zu"):
+            return np.column_stack([self.column(c) for c in ["xu", "yu", "zu"]])
+        if self.has("xsu", "ysu", "zsu"):
+            return np.column_stack([self.column(c) for c in ["xsu", "ysu", "zsu"]]) * lengths + lower
+        if self.has("x", "y", "z"):
+            pos = np.column_stack([self.column(c) for c in ["x", "y", "z"]])
+        elif self.has("xs", "ys", "zs"):
+            pos = np.column_stack([self.column(c) for c in ["xs", "ys", "zs"]]) * lengths + lower
+        else:
+            raise Exception("Dump frame at timestep {0:d} has no atom coordinates".format(self.timestep))
+        if self.has("ix", "iy", "iz"):
+            pos += np.column_stack([self.column(c) for c in ["ix", "iy", "iz"]]) * lengths
+        return pos
+
+class FramePositions:
+    '''
+    Positions of the atoms of a data file in the rows of its atom table,
+    updated from dump frames by atom id, with a mask of the atoms the last
+    frame contained
+    '''
+    def __init__(self, data):
+        self.data = data
+        self.pos = np.zeros((data.atoms.size, 3))
+        self.seen = np.zeros(data.atoms.size, dtype=bool)
+
+    def update(self, frame):
+        # dump order is arbitrary, and a dump of a group leaves atoms out
+        rows = self.data.atom_rows(frame.ids)
+        self.seen[:] = False
+        self.seen[rows] = True
+        self.pos[rows] = frame.positions()
+        return self.pos
+
+    def present_bonds(self, rows_1, rows_2):
+        '''
+        Index of the bonds whose atoms are both in the last frame (a slice of
+        all of them if none is missing) and the number of bonds left out
+        '''
+        present = self.seen[rows_1] & self.seen[rows_2]
+        missing = int(present.size - np.count_nonzero(present))
+        if missing == 0:
+            return slice(None), 0
+        return present, missing
+
+def next_item(stream, item):
+    line = stream.readline()
+    if line == "":
+        return None
+    if not line.startswith("ITEM: " + item):
+        raise Exception("Expected 'ITEM: {0:s}' in dump file, found: {1:s}".format(item, line.rstrip()))
+    return line
+
+def iter_frames(stream):
+    '''
+    Yield the frames of a dump file one at a time
+    '''
+    while True:
+        if next_item(stream, "TIMESTEP") is None:
+            return
+        timestep = int(stream.readline())
+        next_item(stream, "NUMBER OF ATOMS")
+        natoms = int(stream.readline())
+        bounds = next_item(stream, "BOX BOUNDS")
+        if "xy" in bounds.split():
+            raise Exception("Triclinic dump boxes are not supported")
+        box = lammps_data.Box(0., 0., 0., 0., 0., 0.)
+        for ax in [0, 1, 2]:
+            linesp = stream.readline().split()
+            box.dim[ax][0] = float(linesp[0])
+            box.dim[ax][1] = float(linesp[1])
+        columns = next_item(stream, "ATOMS").split()[2:]
+        text = "".join(itertools.islice(stream, natoms))
+        values = np.fromstring(text, dtype=np.float64, sep=' ') if natoms else np.empty(0)
+        if values.size != natoms * len(columns):
+            raise Exception("Dump frame at timestep {0:d} should have {1:d} atoms with {2:d} numeric values "
+                            "each".format(timestep, natoms, len(columns)))
+        yield Frame(timestep, box, columns, values.reshape(natoms, len(columns)))
@@ -0,0 +1,114 @@
+# Multi-process reader for large LAMMPS data files.
+#
+# The input file is memory-mapped and scanned for the byte ranges of the Atoms
+# and Bonds sections, following the same rules as lammps_data.iter_data. Each
+# range is split on line boundaries into chunks that a process pool converts
+# to record arrays with the same parser as the serial path; the chunks are
+# concatenated in file order, so the result is identical to
+# lammps_data.read_data.
+
+import io
+import mmap
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import lammps_data
+from lammps_data import Section, find_section
+
+# smallest number of bytes worth handing to a worker
+MIN_CHUNK_BYTES = 1 << 22
+
+def scan_sections(mm):
+    '''
+    Return the raw lines of the text sections and the (start, stop) byte
+    ranges of the Atoms and Bonds records in a mapped data file
+    '''
+    size = len(mm)
+    lines = {Section.preamble: [], Section.other: [], Section.rest: []}
+    ranges = {}
+    section = Section.preamble
+    pos = 0
+    while pos < size:
+        if section == Section.atoms or section == Section.bonds:
+            # skip blank lines before the first record; the first blank line
+            # after it ends the section
+            while mm[pos:pos + 1] == b"\n":
+                pos += 1
+            end = mm.find(b"\n\n", pos)
+            stop = size if end < 0 else end + 1
+            ranges[section] = (pos, stop)
+            pos = size if end < 0 else end + 2
+            section = Section.other if section == Section.atoms else Section.rest
+            continue
+        if section == Section.rest:
+            lines[section] = list(io.StringIO(mm[pos:].decode()))
+            break
+        newline = mm.find(b"\n", pos)
+        stop = size if newline < 0 else newline + 1
+        line = mm[pos:stop].decode()
+        pos = stop
+        if section == Section.preamble and find_section(line, "Atoms"):
+            section = Section.atoms
+        elif section == Section.other and find_section(line, "Bonds"):
+            section = Section.bonds
+        else:
+            lines[section].append(line)
+    return lines, ranges
+
+def split_range(mm, start, stop, pieces):
+    '''
+    Split [start, stop) into up to pieces ranges that end on line boundaries
+    '''
+    bounds = [start]
+    step = max((stop - start) // pieces, MIN_CHUNK_BYTES)
+    while bounds[-1] + step < stop:
+        newline = mm.find(b"\n", bounds[-1] + step, stop)
+        if newline < 0:
+            break
+        bounds.append(newline + 1)
+    if bounds[-1] < stop:
+        bounds.append(stop)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def parse_range(path, start, stop, section_value):
+    with open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            text = mm[start:stop].decode()
+    num_lines = text.count("\n") + (0 if text.endswith("\n") else 1)
+    if Section(section_value) == Section.atoms:
+        return lammps_data.parse_atoms(text, num_lines)
+    return lammps_data.parse_bonds(text, num_lines)
+
+def read_data(path, workers):
+    '''
+    Read the data file at path using a pool of workers processes
+    '''
+    data = lammps_data.DataFile()
+    with open(path, 'rb') as f:
+        if f.seek(0, 2) == 0:
+            return data
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # CRLF line ends are only handled by the text-mode reader
+            crlf = mm.find(b"\r") >= 0
+            if not crlf:
+                lines, ranges = scan_sections(mm)
+                jobs = {section: split_range(mm, start, stop, 4 * workers)
+                        for section, (start, stop) in ranges.items()}
+    if crlf:
+        with open(path) as infile:
+            return lammps_data.read_data(infile)
+
+    data.preamble = lines[Section.preamble]
+    data.other = lines[Section.other]
+    data.rest = lines[Section.rest]
+    for line in data.preamble:
+        lammps_data.parse_box_line(data.box, line)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {section: [pool.submit(parse_range, path, start, stop, section.value)
+                             for start, stop in chunks]
+                   for section, chunks in jobs.items()}
+        if futures.get(Section.atoms):
+            data.atoms = np.concatenate([future.result() for future in futures[Section.atoms]])
+        if futures.get(Section.bonds):
+            data.bonds = np.concatenate([future.result() for future in futures[Section.bonds]])
+    return data
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+# Usage:
+# report_bond_energy.py -s 1=fene:30,1.5,1,1 [-s 2=harmonic:100,1 ...] < data.in > energy.out
+# report_bond_energy.py -s ... -i data.in --dump dump.lammpstrj > frames.out
+# Calculate the energy of every bond in a LAMMPS data file from its minimum
+# image length, with the bond style and constants given for its bond type (see
+# bond_potential.py; a type of * applies to all types not given otherwise), and
+# report the per-type and total energies and the highest-energy bonds. Bonds
+# at or beyond the longest distance their style is defined at (r_0 for FENE)
+# are reported as broken and left out of the sums. With --dump, the bonds and
+# box of the data file are used as the topology and the total energy of every
+# frame of a LAMMPS text dump is reported, one line per frame; bonds with an
+# atom missing from a frame are left out of its sums and counted.
+
+import sys
+import argparse
+import numpy as np
+import lammps_data
+import lammps_dump
+import bond_potential
+import report_bond_lengths
+import timings
+import compressed_io
+
+class BondStyles:
+    '''
+    Bond style of every bond type, from <bond type>=<style>:<constants> strings
+    '''
+    def __init__(self, specs):
+        self.styles = {}
+        self.default = None
+        for spec in specs:
+            parms = spec.split('=', 1)
+            if len(parms) != 2:
+                raise Exception("Malformed bond style mapping '{0:s}'; expected "
+                                "<bond type>=<style>:<constants>".format(spec))
+            style = bond_potential.compile_style(parms[1])
+            if parms[0].strip() == "*":
+                self.default = style
+            else:
+                self.styles[int(parms[0])] = style
+
+    def style(self, bond_type):
+        if bond_type in self.styles:
+            return self.styles[bond_type]
+        if self.default is None:
+            raise Exception("No bond style given for bond type {0:d}".format(bond_type))
+        return self.default
+
+    def energies(self, types, lengths):
+        '''
+        Energy of every bond and a mask of the broken bonds, whose energy is nan
+        '''
+        energy = np.empty(lengths.size)
+        broken = np.zeros(lengths.size, dtype=bool)
+        bond_types, inverse = np.unique(types, return_inverse=True)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(bond_types.size + 1))
+        for t, bond_type in enumerate(bond_types.tolist()):
+            rows = order[bounds[t]:bounds[t + 1]]
+            style = self.style(bond_type)
+            r = lengths[rows]
+            with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+                e = style.energy(r)
+            bad = (r >= style.max_distance) | ~np.isfinite(e)
+            e[bad] = np.nan
+            energy[rows] = e
+            broken[rows] = bad
+        return energy, broken
+
+def write_energy_report(out, bonds, lengths, energy, broken, styles, top=10):
+    bond_types, inverse = np.unique(bonds['type'], return_inverse=True)
+    valid = ~broken
+    sums = np.bincount(inverse, weights=np.where(valid, energy, 0.), minlength=bond_types.size)
+    counts = np.bincount(inverse, minlength=bond_types.size)
+    num_broken = np.bincount(inverse, weights=broken, minlength=bond_types.size).astype(np.int64)
+    for t, bond_type in enumerate(bond_types.tolist()):
+        num_valid = int(counts[t] - num_broken[t])
+        mean = sums[t] / num_valid if num_valid else float('nan')
+        out.write("Bond type {0:d} ({1:s}): {2:d} bonds; energy total {3:.6f} mean {4:.6f}; "
+                  "broken: {5:d}\n".format(bond_type, styles.style(bond_type).name, int(counts[t]), sums[t], mean,
+                                           int(num_broken[t])))
+    out.write("Total bond energy: {0:.6f} ({1:d} bonds, {2:d} broken)\n".format(sums.sum(), bonds.size,
+                                                                               int(num_broken.sum())))
+
+    candidates = np.flatnonzero(valid)
+    if top > 0 and candidates.size:
+        if candidates.size > top:
+            candidates = candidates[np.argpartition(energy[candidates], -top)[-top:]]
+        highest = candidates[np.argsort(-energy[candidates], kind='stable')]
+        out.write("Highest {0:d} bond energies (bond type atom_1 atom_2 length energy):\n".format(highest.size))
+        lammps_data.write_records(out, lammps_data.BOND_FORMAT + " %.6f %.6f",
+                                  lammps_data.bond_columns(bonds[highest]) + [lengths[highest], energy[highest]])
+    if np.any(broken):
+        out.write("Broken bonds (bond type atom_1 atom_2 length):\n")
+        lammps_data.write_records(out, lammps_data.BOND_FORMAT + " %.6f",
+                                  lammps_data.bond_columns(bonds[broken]) + [lengths[broken]])
+
+def report_energy(out, data, styles, top=10):
+    with timings.phase("compute", data.bonds.size):
+        lengths = report_bond_lengths.data_bond_lengths(data)
+        energy, broken = styles.energies(data.bonds['type'], lengths)
+    with timings.phase("write", data.bonds.size):
+        write_energy_report(out, data.bonds, lengths, energy, broken, styles, top)
+
+def report_trajectory(out, data, dump, styles):
+    '''
+    Total bond energy of every frame in the dump, using the bonds of data;
+    bonds with an atom that is not in a frame are left out and counted as missing
+    '''
+    rows_1 = data.atom_rows(data.bonds['atom_1'])
+    rows_2 = data.atom_rows(data.bonds['atom_2'])
+    positions = lammps_dump.FramePositions(data)
+    out.write("# timestep bonds energy max broken missing\n")
+    for frame in lammps_dump.iter_frames(dump):
+        report_bond_lengths.check_box(frame.box)
+        with timings.phase("compute", rows_1.size):
+            full_pos = positions.update(frame)
+            present, missing = positions.present_bonds(rows_1, rows_2)
+            lengths = report_bond_lengths.bond_lengths(frame.box, full_pos, rows_1[present], rows_2[present])
+            energy, broken = styles.energies(data.bonds['type'][present], lengths)
+        valid = energy[~broken]
+        out.write("{0:d} {1:d} {2:.6f} {3:.6f} {4:d} {5:d}\n".format(frame.timestep, lengths.size, valid.sum(),
+                                                                     valid.max() if valid.size else float('nan'),
+                                                                     int(np.count_nonzero(broken)), missing))
+        out.flush()
+
+def add_arguments(parser):
+    '''
+    Options of the bond energy stage
+    '''
+    parser.add_argument("-s", "--style", help="bond style of a bond type, as <bond type>=<style>:<constants> with "
+                        "the styles of bond_potential.py, e.g. 1=fene:30,1.5,1,1; a bond type of * applies to all "
+                        "other types; may be repeated", type=str, action="append", required=True)
+    parser.add_argument("--dump", help="report the total bond energy of every frame of this LAMMPS text dump, "
+                        "using the bonds of the data file", type=str)
+    parser.add_argument("--top", help="number of highest-energy bonds listed (default: %(default)s)",
+                        type=int, default=10)
+
+def run(data, args, report=sys.stdout):
+    '''
+    Write the bond energy report of data to report; data is not changed
+    '''
+    styles = BondStyles(args.style)
+    if args.dump is not None:
+        with compressed_io.open_input(args.dump, getattr(args, "io_thread", False)) as dump:
+            report_trajectory(report, data, dump, styles)
+    else:
+        report_energy(report, data, styles, args.top)
+
+def main():
+    parser = argparse.ArgumentParser()
+    lammps_data.add_input_arguments(parser)
+    lammps_data.add_output_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+    data = lammps_data.load_data(args)
+    out = lammps_data.open_output(args)
+    run(data, args, out)
+    if args.output is not None:
+        out.close()
+
+if __name__ == "__main__":
+    main()
@@ -2,258 +2,190 @@
 
 # Usage:
 # report_bond_lengths.py < data.in > bonds.out
-# Calculate and report the length of each bond in a LAMMPS data file
+# report_bond_lengths.py -i data.in --dump dump.lammpstrj > frames.out
+# report_bond_lengths.py -i data.in.xz --dump dump.lammpstrj.gz --io-thread -o frames.out
+# Calculate and report the length of each bond in a LAMMPS data file. With
+# --dump, the bonds and box of the data file are used as the topology and the
+# bond length statistics of every frame of a LAMMPS text dump are reported,
+# one line per frame; bonds with an atom missing from a frame (e.g. a dump of
+# a group) are left out of its statistics and counted. With --summary, only per-bond-type statistics and
+# histograms and the longest bonds are reported instead of one line per bond.
 
 import sys
-from enum import Enum
+import argparse
 import numpy as np
-
-# a Kremer-Grest "atom"
-class AtomKG:
-    def __init__(self, atom_line):
-        self.pos = [0., 0., 0.]
-        self.image = [0, 0, 0]
-        contents = atom_line.split(' ')
-        num_values = len(contents)
-        if num_values != 9:
-            raise Exception("An atom line is expected to have 9 values: {0:d} found.\nLine was: {1:s}".format(num_values, atom_line))
-        self.atom_id = int(contents[0])
-        self.mol_id = int(contents[1])
-        self.atom_type = int(contents[2])
-        self.pos[0] = float(contents[3])
-        self.pos[1] = float(contents[4])
-        self.pos[2] = float(contents[5])
-        self.image[0] = int(contents[6])
-        self.image[1] = int(contents[7])
-        self.image[2] = int(contents[8])
-        self.nbonds = 0
-
-    def __str__(self):
-        return "{0:d} {1:d} {2:d} {3:f} {4:f} {5:f} {6:d} {7:d} {8:d}".format(self.atom_id,
-                                                                              self.mol_id,
-                                                                              self.atom_type,
-                                                                              self.pos[0],
-                                                                              self.pos[1],
-                                                                              self.pos[2],
-                                                                              self.image[0],
-                                                                              self.image[1],
-                                                                              self.image[2])
-
-class Bond:
-    def __init__(self, bond_line):
-        contents = bond_line.split(' ')
-        num_values = len(contents)
-        if num_values != 4:
-            raise Exception("A bond line is expected to have 4 values: {0:d} found.".format(num_values))
-        self.bond_id = int(contents[0])
-        self.bond_type = int(contents[1])
-        self.atom_1 = int(contents[2])
-        self.atom_2 = int(contents[3])
-        self.length = None
-
-    def __str__(self):
-        return "{0:d} {1:d} {2:d} {3:d}".format(self.bond_id,
-                                                self.bond_type,
-                                                self.atom_1,
-                                                self.atom_2)
-
-class Section(Enum):
-    preamble = 1
-    atoms = 2
-    other = 3
-    bonds = 4
-    rest = 5
-
-class Box:
-    def __init__(self, xlo, xhi, ylo, yhi, zlo, zhi):
-        self.dim = [[0., 0.], [0., 0.], [0., 0.]]
-        self.dim[0][0] = xlo
-        self.dim[0][1] = xhi
-        self.dim[1][0] = ylo
-        self.dim[1][1] = yhi
-        self.dim[2][0] = zlo
-        self.dim[2][1] = zhi
-    def xlen(self):
-        return self.length(0)
-    def ylen(self):
-        return self.length(1)
-    def zlen(self):
-        return self.length(2)
-    def length(self, dimension):
-        return self.dim[dimension][1] - self.dim[dimension][0]
-
-found_atoms_section = False
-found_atom_records = False
-
-atoms = {} # indexed by atom id
-bonds = [] # in order in which they were read
-
-
-data_out = { Section.preamble: [], Section.atoms: ["Atoms # bond", ""], Section.other: [],
-             Section.bonds: ["Bonds", ""], Section.rest: []}
-
-def copy_line(line, _section):
-    data_out[_section].append(line)
-
-def find_section(line, section):
-    if line[:(len(section))] == section:
-#    if line.split(' ')[0] == section:
-        return True
-    return False
-
-section = Section.preamble
-
-def calculate_distance(box, atom1, atom2):
-    def fullpos(atom):
-        def fulldim(axis, reldim, imagenum):
-#            print("axis = ", axis, "reldim = ", reldim, "imagenum = ", imagenum)
-            return reldim + box.length(axis) * imagenum
-        return [fulldim(ax, atom.pos[ax], atom.image[ax]) for ax in [0, 1, 2]]
-    pos1 = np.array(fullpos(atom1))
-#    print('Debug: atom {0:d} (1) y-position = {1:.3f}'.format(atom1.atom_id, pos1[1]))
-    pos2 = np.array(fullpos(atom2))
-#    print('Debug: atom {0:d} (2) y-position = {1:.3f}'.format(atom2.atom_id, pos2[1]))
-    dist = pos2 - pos1
-    def min_image(distance):
-        '''
-        If image flags are inconsistent, it may appear that some bonds are longer
-        than they are in reality. This is because one of the participating atoms
-        does not appear in the data file with the correct image flag from the point
-        of view of the bond. The real atom that actually participates in the bond in
-        this case is an image of the atom listed in the data file. The image flag
-        is set to the value in the data file to keep track of the original atoms, and
-        therefore the center of mass of the system. LAMMPS performs this same
-        procedure to correctly calculate the bond lengths in Domain::minimum_image
-        '''
-        for ax in [0, 1, 2]:
-            while np.abs(distance[ax]) > box.length(ax) / 2.:
-                if distance[ax] < 0.0:
-                    distance[ax] += box.length(ax)
-                else:
-                    distance[ax]-= box.length(ax)
-        return distance
-    min_dist = min_image(dist)
-#    print('Debug: y-distance = {0:.3f}'.format(dist[1]))
-    return np.sqrt(np.sum(np.square(min_dist)))
-
-
-n_types = 0
-
-thebox = Box(0., 0., 0., 0., 0., 0.)
-bond_length_min = 99999999.
-bond_length_max = 0.
-
-def calculate_bond_distances():
-    if thebox.xlen() == 0. or thebox.ylen() == 0. or thebox.zlen() == 0.:
+import lammps_data
+import lammps_dump
+import bond_stats
+import timings
+import compressed_io
+
+# number of bonds whose endpoints are gathered at once
+BOND_CHUNK = 1 << 22
+
+def iter_bond_lengths(box, full_pos, rows_1, rows_2):
+    '''
+    Yield (start, lengths) for consecutive blocks of bonds; full_pos holds the
+    unwrapped atom positions and rows_1/rows_2 the rows of the bond endpoints
+    in it
+    '''
+    box_lengths = box.lengths()
+    for start in range(0, rows_1.size, BOND_CHUNK):
+        stop = start + BOND_CHUNK
+        dist = full_pos[rows_2[start:stop]]
+        dist -= full_pos[rows_1[start:stop]]
+        lammps_data.minimum_image(dist, box_lengths)
+        np.square(dist, out=dist)
+        yield start, np.sqrt(dist.sum(axis=1))
+
+def bond_lengths(box, full_pos, rows_1, rows_2):
+    '''
+    Minimum-image length of every bond
+    '''
+    lengths = np.empty(rows_1.size)
+    for start, block in iter_bond_lengths(box, full_pos, rows_1, rows_2):
+        lengths[start:start + block.size] = block
+    return lengths
+
+def data_bond_lengths(data):
+    '''
+    Minimum-image length of every bond of a data file, in the order of data.bonds
+    '''
+    check_box(data.box)
+    full_pos = lammps_data.unwrapped_positions(data.atoms, data.box)
+    return bond_lengths(data.box, full_pos, data.atom_rows(data.bonds['atom_1']),
+                        data.atom_rows(data.bonds['atom_2']))
+
+def check_box(box):
+    if box.xlen() == 0. or box.ylen() == 0. or box.zlen() == 0.:
         raise Exception("No box defined!")
-    global bond_length_min, bond_length_max
-    # calculate all bond lengths
-    for bond in bonds:
-        bond.length = calculate_distance(thebox, atoms[bond.atom_1],
-                                         atoms[bond.atom_2])
-        if bond.length < bond_length_min:
-            bond_length_min = bond.length
-        if bond.length > bond_length_max:
-            bond_length_max = bond.length
-
-distances_done = False
-
-for line in sys.stdin:
-    # TODO: this check looks unnecessary
-    if line == "": # EOF
-        break
-
-    if section == Section.preamble:
-        # look for the Atoms section
-        if not find_section(line, "Atoms"):
-            # look for the box dimensions
-            linesp = line.split(' ')
-            if "xhi" in line:
-#                print("Debug: found x box line")
-                thebox.dim[0][0] = float(linesp[0])
-                thebox.dim[0][1] = float(linesp[1])
-            elif "yhi" in line:
-#                print("Debug: found y box line")
-                thebox.dim[1][0] = float(linesp[0])
-                thebox.dim[1][1]= float(linesp[1])
-            elif "zhi" in line:
-#                print("Debug: found z box line")
-                thebox.dim[2][0] = float(linesp[0])
-                thebox.dim[2][1] = float(linesp[1])
-
-            copy_line(line, section)
-        else:
-#            #print("DEBUG: Found section atoms")
-            section = Section.atoms
-            continue
 
-    elif section == Section.atoms:
-        # populate atom records and look for the end of the section
-        if line == "\n":
-#            #print("DEBUG: Found empty line in section 'Atoms'")
-            if len(atoms) > 0:
-                # end of atoms section
-                section = Section.other
-        else:
-            # populate the atoms dictionary
-#            #print("DEBUG: Found an atom")
-            atom = AtomKG(line)
-            atoms[atom.atom_id] = atom
-
-    elif section == Section.other:
-#        #print("DEBUG: in section 'other'")
-        # look for the Bonds section
-        if not find_section(line, "Bonds"):
-            copy_line(line, section)
-            #print("DEBUG: line is: "+line)
-        else:
-            #print("DEBUG: Found section 'Bonds'")
-            section = Section.bonds
-            continue
-
-    elif section == Section.bonds:
-        # populate the bond records and look for the end of the section
-        #print("DEBUG: in section 'Bonds'; line is: "+line)
-        if line == "\n":
-            if len(bonds) > 0:
-                #print("DEBUG: end of section 'Bonds'")
-                # end of bonds section
-                section = Section.rest
-                calculate_bond_distances()
+def write_bond_lines(out, atoms, bonds, lengths, rows_1, rows_2, cutoff=2.5):
+    '''
+    One line per bond, followed by the atom lines of any bond longer than cutoff
+    '''
+    fmt = lammps_data.BOND_FORMAT + " length: %r"
+    for start in range(0, bonds.size, lammps_data.WRITE_CHUNK):
+        stop = start + lammps_data.WRITE_CHUNK
+        text = lammps_data.format_records(fmt, lammps_data.bond_columns(bonds[start:stop]) + [lengths[start:stop]])
+        long_bonds = np.flatnonzero(lengths[start:stop] > cutoff)
+        if long_bonds.size > 0:
+            lines = text.splitlines(keepends=True)
+            atom_fmt = lammps_data.ATOM_FORMAT
+            atom_lines_1 = lammps_data.format_records(atom_fmt, lammps_data.atom_columns(atoms[rows_1[start + long_bonds]]))
+            atom_lines_2 = lammps_data.format_records(atom_fmt, lammps_data.atom_columns(atoms[rows_2[start + long_bonds]]))
+            pieces = []
+            last = 0
+            for i, line_1, line_2 in zip((long_bonds + 1).tolist(), atom_lines_1.splitlines(keepends=True),
+                                         atom_lines_2.splitlines(keepends=True)):
+                pieces.extend(lines[last:i])
+                pieces.append("WARNING: long bond; atom lines below: \n" + line_1 + line_2 + "\n")
+                last = i
+            pieces.extend(lines[last:])
+            text = "".join(pieces)
+        out.write(text)
+
+def report_data(out, data, cutoff):
+    check_box(data.box)
+    # calculate all bond lengths
+    with timings.phase("compute", data.bonds.size):
+        rows_1 = data.atom_rows(data.bonds['atom_1'])
+        rows_2 = data.atom_rows(data.bonds['atom_2'])
+        full_pos = lammps_data.unwrapped_positions(data.atoms, data.box)
+        lengths = bond_lengths(data.box, full_pos, rows_1, rows_2)
+        bond_length_min = lengths.min() if lengths.size else 99999999.
+        bond_length_max = lengths.max() if lengths.size else 0.
+
+    # Print bond information
+    with timings.phase("write", data.bonds.size):
+        write_bond_lines(out, data.atoms, data.bonds, lengths, rows_1, rows_2, cutoff)
+    out.write("Shortest bond: {0:.3f}\nLongest bond: {1:.3f}\n".format(bond_length_min,
+                                                                       bond_length_max))
+    out.write("Box dimensions (x, y, z): {0:.2f}, {1:.2f}, {2:.2f}\n".format(data.box.xlen(),
+                                                                             data.box.ylen(),
+                                                                             data.box.zlen()))
+
+def report_summary(out, data, summary):
+    '''
+    Per-type statistics of the bond lengths, accumulated one block at a time
+    '''
+    check_box(data.box)
+    with timings.phase("compute", data.bonds.size):
+        rows_1 = data.atom_rows(data.bonds['atom_1'])
+        rows_2 = data.atom_rows(data.bonds['atom_2'])
+        full_pos = lammps_data.unwrapped_positions(data.atoms, data.box)
+        for start, lengths in iter_bond_lengths(data.box, full_pos, rows_1, rows_2):
+            summary.add(data.bonds[start:start + lengths.size], lengths)
+    with timings.phase("write"):
+        summary.write(out)
+    out.write("Box dimensions (x, y, z): {0:.2f}, {1:.2f}, {2:.2f}\n".format(data.box.xlen(),
+                                                                             data.box.ylen(),
+                                                                             data.box.zlen()))
+
+def report_trajectory(out, data, dump, cutoff):
+    '''
+    Bond length statistics of every frame in the dump, using the bonds of data;
+    bonds with an atom that is not in a frame are left out and counted as missing
+    '''
+    rows_1 = data.atom_rows(data.bonds['atom_1'])
+    rows_2 = data.atom_rows(data.bonds['atom_2'])
+    positions = lammps_dump.FramePositions(data)
+    out.write("# timestep bonds min max mean long(>{0:g}) missing\n".format(cutoff))
+    for frame in lammps_dump.iter_frames(dump):
+        check_box(frame.box)
+        with timings.phase("compute", rows_1.size):
+            full_pos = positions.update(frame)
+            present, missing = positions.present_bonds(rows_1, rows_2)
+            lengths = bond_lengths(frame.box, full_pos, rows_1[present], rows_2[present])
+        if lengths.size:
+            out.write("{0:d} {1:d} {2:.6f} {3:.6f} {4:.6f} {5:d} {6:d}\n".format(
+                frame.timestep, lengths.size, lengths.min(), lengths.max(), lengths.mean(),
+                int(np.count_nonzero(lengths > cutoff)), missing))
         else:
-            #print("DEBUG: Found a bond")
-            bond = Bond(line)
-            bonds.append(bond)
-            atoms[bond.atom_1].nbonds += 1
-            atoms[bond.atom_2].nbonds += 1
+            out.write("{0:d} 0 nan nan nan 0 {1:d}\n".format(frame.timestep, missing))
+        out.flush()
+
+def add_arguments(parser):
+    '''
+    Options of the bond report stage
+    '''
+    parser.add_argument("--dump", help="report per-frame statistics for the frames of this LAMMPS text dump, "
+                        "using the bonds of the data file", type=str)
+    parser.add_argument("--cutoff", help="bonds longer than this are reported as long (default: %(default)s)",
+                        type=float, default=2.5)
+    parser.add_argument("--summary", help="report per-bond-type statistics, histograms and the longest bonds "
+                        "instead of one line per bond", action="store_true")
+    parser.add_argument("--bins", help="number of histogram bins in summary mode (default: %(default)s)",
+                        type=int, default=100)
+    parser.add_argument("--max-length", help="upper end of the histogram range in summary mode (default: %(default)s)",
+                        type=float, default=5.)
+    parser.add_argument("--top", help="number of longest bonds listed in summary mode (default: %(default)s)",
+                        type=int, default=10)
+
+def run(data, args, report=sys.stdout):
+    '''
+    Write the report selected by args on data to report; data is not changed
+    '''
+    if args.dump is not None:
+        with compressed_io.open_input(args.dump, getattr(args, "io_thread", False)) as dump:
+            report_trajectory(report, data, dump, args.cutoff)
+    elif args.summary:
+        summary = bond_stats.BondSummary(bins=args.bins, max_value=args.max_length, top=args.top, cutoff=args.cutoff)
+        report_summary(report, data, summary)
     else:
-        # copy over each line
-        copy_line(line, section)
-
-if not distances_done:
-    calculate_bond_distances()
-
-# Update the number of atom types in the preamble
-preamble = data_out[Section.preamble]
-for i in range(0, len(preamble) - 1):
-    l = preamble[i]
-    if "atom types" in l:
-        preamble[i] = "{0:d} atom types".format(n_types)
-
-# Print the sections in order
-# for s in [Section.preamble, Section.atoms, Section.other, Section.bonds, Section.rest]:
-#     for line in data_out[s]:
-#         print(line.rstrip())
-# Print bond information
-for bond in bonds:
-    print(str(bond) + " length: " + str(bond.length))
-    if bond.length > 2.5:
-        print("WARNING: long bond; atom lines below: ")
-        print(atoms[bond.atom_1])
-        print(atoms[bond.atom_2])
-        print('')
-print("Shortest bond: {0:.3f}\nLongest bond: {1:.3f}".format(bond_length_min,
-                                                             bond_length_max))
-print("Box dimensions (x, y, z): {0:.2f}, {1:.2f}, {2:.2f}".format(thebox.xlen(),
-                                                                   thebox.ylen(),
-                                                                   thebox.zlen()))
+        report_data(report, data, args.cutoff)
+
+def main():
+    parser = argparse.ArgumentParser()
+    lammps_data.add_input_arguments(parser)
+    lammps_data.add_output_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+    data = lammps_data.load_data(args)
+    out = lammps_data.open_output(args)
+    run(data, args, out)
+    if args.output is not None:
+        out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+# Usage:
+# report_close_contacts.py [-c CUTOFF] < data.in > contacts.out
+# Find non-bonded atom pairs in a LAMMPS data file that are closer than the
+# cutoff (minimum image convention), e.g. overlaps left by chain building or
+# wall insertion that would blow up the first step of a simulation. Pairs of
+# bonded atoms are excluded. The offending pairs are listed from the closest,
+# with the smaller atom id first, followed by the number of pairs and the
+# closest distance per atom type pair.
+
+import sys
+import argparse
+import numpy as np
+import lammps_data
+import cell_list
+import timings
+
+def add_arguments(parser):
+    '''
+    Options of the close contact stage
+    '''
+    parser.add_argument("-c", "--cutoff", help="report non-bonded pairs closer than this (default: %(default)s)",
+                        type=float, default=0.8)
+    parser.add_argument("--top", help="list at most this many pairs, closest first (default: all)", type=int)
+
+def close_contacts(data, cutoff):
+    '''
+    (i, j, distance) of the non-bonded atom row pairs closer than cutoff
+    '''
+    if data.box.xlen() == 0. or data.box.ylen() == 0. or data.box.zlen() == 0.:
+        raise Exception("No box defined!")
+    atoms = data.atoms
+
+    i, j, dist = cell_list.close_pairs(atoms['pos'], data.box, cutoff)
+
+    # drop the bonded pairs
+    if data.bonds.size and i.size:
+        ids_i = atoms['id'][i]
+        ids_j = atoms['id'][j]
+        max_id = int(max(atoms['id'].max(), data.bonds['atom_1'].max(), data.bonds['atom_2'].max()))
+        bonded = np.isin(cell_list.pair_keys(ids_i, ids_j, max_id),
+                         cell_list.pair_keys(data.bonds['atom_1'], data.bonds['atom_2'], max_id))
+        keep = ~bonded
+        i, j, dist = i[keep], j[keep], dist[keep]
+    return i, j, dist
+
+def run(data, args, report=sys.stdout):
+    '''
+    Write the close contacts of data to report; data is not changed
+    '''
+    atoms = data.atoms
+    with timings.phase("compute", atoms.size):
+        i, j, dist = close_contacts(data, args.cutoff)
+    with timings.phase("write", dist.size):
+        # list each pair with the smaller id first
+        swap = atoms['id'][i] > atoms['id'][j]
+        i, j = np.where(swap, j, i), np.where(swap, i, j)
+        ids_i = atoms['id'][i]
+        ids_j = atoms['id'][j]
+
+        order = np.argsort(dist, kind='stable')
+        if args.top is not None:
+            order = order[:args.top]
+        types_i = atoms['type'][i]
+        types_j = atoms['type'][j]
+        out = report
+        out.write("# atom_1 atom_2 type_1 type_2 distance\n")
+        lammps_data.write_records(out, "%d %d %d %d %.6f", [ids_i[order], ids_j[order], types_i[order],
+                                                            types_j[order], dist[order]])
+
+        out.write("Non-bonded pairs closer than {0:g}: {1:d}\n".format(args.cutoff, dist.size))
+        if dist.size:
+            type_pairs, inverse, counts = np.unique(np.column_stack((np.minimum(types_i, types_j),
+                                                                     np.maximum(types_i, types_j))),
+                                                    axis=0, return_inverse=True, return_counts=True)
+            mins = np.full(len(type_pairs), np.inf)
+            np.minimum.at(mins, inverse.ravel(), dist)
+            out.write("# type_1 type_2 pairs min_distance\n")
+            lammps_data.write_records(out, "%d %d %d %.6f", [type_pairs[:, 0], type_pairs[:, 1], counts, mins])
+
+def main():
+    parser = argparse.ArgumentParser()
+    lammps_data.add_input_arguments(parser)
+    lammps_data.add_output_arguments(parser)
+    add_arguments(parser)
+    args = parser.parse_args()
+    data = lammps_data.load_data(args)
+    out = lammps_data.open_output(args)
+    run(data, args, out)
+    if args.output is not None:
+        out.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,199 +1,200 @@
 #!/usr/bin/env python3
 
 # Usage:
-# retype_atoms_by_bonds.py <type> <# of bonds> <new type> [<type> <# of bonds> <new type>][...] < data.in > data.out
+# retype_atoms_by_bonds.py -r <type>,<# of bonds>,<new type>[,<neighbor type>][;...] < data.in > data.out
+# retype_atoms_by_bonds.py -r ... --stream -i data.in > data.out
 # set the atom type to new type for atoms of original type with the specified number of bonds in a LAMMPS
-# data file
+# data file. The number of bonds may also be "end" (chain ends, 1 bond), "branch" (branch points, 3 or
+# more bonds) or "*" (any), and an optional fourth value requires at least one bonded neighbor of that
+# type. Rules are matched against the original atom types in the order given; the first matching rule
+# retypes an atom. With --stream, the input file is read twice instead of being held in memory: the
+# first pass collects the type and bond count of every atom id, the second rewrites the file.
 
-import sys
 import argparse
-from enum import Enum
-
-parser = argparse.ArgumentParser()
-parser.add_argument("-r", "--retype", help="parameters: x1,y1,z1[;x2,y2,z2;...xn,yn,zn] change atom type x " \
-                                                    "to atom type z if atom of type x " \
-                                                    "participates in y bonds", type=str, required=True)
-args = parser.parse_args()
-retype_raw = [parms.split(',') for parms in args.retype.split(';')]
-for parms in retype_raw:
-    if len(parms) != 3:
-        raise Exception("Incorrect number of parameters for the retype argumenp")
-# atom_type: (nbonds, new_type)
-retype = { int(parms[0]): (int(parms[1]), int(parms[2])) for parms in retype_raw }
+import numpy as np
+import lammps_data
+import timings
+import compressed_io
+from lammps_data import Section
+from bond_graph import BondGraph
+
+class RetypeRule:
+    def __init__(self, parms):
+        if len(parms) not in [3, 4]:
+            raise Exception("Incorrect number of parameters for the retype argument")
+        self.atom_type = int(parms[0])
+        self.nbonds = parms[1].strip()
+        if self.nbonds not in ["end", "branch", "*"]:
+            self.nbonds = int(self.nbonds)
+        self.new_type = int(parms[2])
+        self.neighbor_type = int(parms[3]) if len(parms) == 4 else None
+
+    def match(self, types, degree, has_neighbor):
+        '''
+        Mask of the atoms this rule applies to; has_neighbor(t) is a mask of
+        the atoms bonded to at least one atom of type t
+        '''
+        mask = types == self.atom_type
+        if self.nbonds == "end":
+            mask &= degree == 1
+        elif self.nbonds == "branch":
+            mask &= degree >= 3
+        elif self.nbonds != "*":
+            mask &= degree == self.nbonds
+        if self.neighbor_type is not None:
+            mask &= has_neighbor(self.neighbor_type)
+        return mask
+
+def parse_rules(text):
+    return [RetypeRule(parms.split(',')) for parms in text.split(';')]
 
 # TODO: add masses for the new atom types
 
-# a Kremer-Grest "atom"
-class AtomKG:
-    def __init__(self, atom_line):
-        contents = atom_line.split()
-        num_values = len(contents)
-        if num_values != 9:
-            raise Exception("An atom line is expected to have 9 values: {0:d} found." \
-            "\nLine: {1:s}".format(num_values, atom_line))
-        self.atom_id = int(contents[0])
-        self.mol_id = int(contents[1])
-        self.atom_type = int(contents[2])
-        self.x = float(contents[3])
-        self.y = float(contents[4])
-        self.z = float(contents[5])
-        self.nx = int(contents[6])
-        self.ny = int(contents[7])
-        self.nz = int(contents[8])
-        self.nbonds = 0
-
-    def __str__(self):
-        return "{0:d} {1:d} {2:d} {3:f} {4:f} {5:f} {6:d} {7:d} {8:d}".format(self.atom_id,
-                                                                              self.mol_id,
-                                                                              self.atom_type,
-                                                                              self.x,
-                                                                              self.y,
-                                                                              self.z,
-                                                                              self.nx,
-                                                                              self.ny,
-                                                                              self.nz)
-
-class Bond:
-    def __init__(self, bond_line):
-        contents = bond_line.split()
-        num_values = len(contents)
-        if num_values != 4:
-            raise Exception("A bond line is expected to have 4 values: {0:d} found.".format(num_values))
-        self.bond_id = int(contents[0])
-        self.bond_type = int(contents[1])
-        self.atom_1 = int(contents[2])
-        self.atom_2 = int(contents[3])
-
-    def __str__(self):
-        return "{0:d} {1:d} {2:d} {3:d}".format(self.bond_id,
-                                                self.bond_type,
-                                                self.atom_1,
-                                                self.atom_2)
-
-class Section(Enum):
-    preamble = 1
-    atoms = 2
-    other = 3
-    bonds = 4
-    rest = 5
-
-found_atoms_section = False
-found_atom_records = False
-
-atoms = {} # indexed by atom id
-bonds = [] # in order in which they were read
-
-
-data_out = { Section.preamble: [], Section.atoms: ["Atoms # bond", ""], Section.other: [],
-             Section.bonds: ["Bonds", ""], Section.rest: []}
-
-def copy_line(line, _section):
-    data_out[_section].append(line)
-
-def find_section(line, section):
-    if line[:(len(section))] == section:
-#    if line.split()[0] == section:
-        return True
-    return False
-
-section = Section.preamble
-
-retype_done = False
-def do_retype():
-    # retype the relevant atoms
-    for k in atoms.keys():
-        atom = atoms[k]
-        if atom.atom_type in retype:
-            #print("DEBUG: atom found in retype")
-            r = retype[atom.atom_type]
-            if atom.nbonds == r[0]:
-                #print("DEBUG: changing atom type")
-                atom.atom_type = r[1]
-                update_n_atom_types(atom.atom_type)
-    # store the atoms and bonds sections
-    for atom in atoms.values():
-        data_out[Section.atoms].append(str(atom))
-    data_out[Section.atoms].append("")
-    #print("DEBUG: {0:d} bonds".format(len(bonds)))
-    for bond in bonds:
-        data_out[Section.bonds].append(str(bond))
-    retype_done = True
-
-n_types = 0
-def update_n_atom_types(n):
-    global n_types
-    if n > n_types:
-        n_types = n
-
-for line in sys.stdin:
-    # TODO: this check looks unnecessary
-    if line == "": # EOF
-        break
-
-    if section == Section.preamble:
-        # look for the Atoms section
-        if not find_section(line, "Atoms"):
-            copy_line(line, section)
-        else:
-#            #print("DEBUG: Found section atoms")
-            section = Section.atoms
-            continue
-
-    elif section == Section.atoms:
-        # populate atom records and look for the end of the section
-        if line == "\n":
-#            #print("DEBUG: Found empty line in section 'Atoms'")
-            if len(atoms) > 0:
-                # end of atoms section
-                section = Section.other
-        else:
-            # populate the atoms dictionary
-#            #print("DEBUG: Found an atom")
-            atom = AtomKG(line)
-            atoms[atom.atom_id] = atom
-            update_n_atom_types(atom.atom_type)
-
-    elif section == Section.other:
-#        #print("DEBUG: in section 'other'")
-        # look for the Bonds section
-        if not find_section(line, "Bonds"):
-            copy_line(line, section)
-            #print("DEBUG: line is: "+line)
-        else:
-            #print("DEBUG: Found section 'Bonds'")
-            section = Section.bonds
-            continue
-
-    elif section == Section.bonds:
-        # populate the bond records and look for the end of the section
-        #print("DEBUG: in section 'Bonds'; line is: "+line)
-        if line == "\n":
-            if len(bonds) > 0:
-                #print("DEBUG: end of section 'Bonds'")
-                # end of bonds section
-                section = Section.rest
-                do_retype()
-        else:
-            #print("DEBUG: Found a bond")
-            bond = Bond(line)
-            bonds.append(bond)
-            atoms[bond.atom_1].nbonds += 1
-            atoms[bond.atom_2].nbonds += 1
+def apply_rules(rules, types, degree, has_neighbor):
+    '''
+    Return the new atom types and the highest atom type in use afterwards
+    '''
+    new_types = types.copy()
+    retyped = np.zeros(types.size, dtype=bool)
+    n_types = int(types.max()) if types.size else 0
+    # rules are matched against the original types
+    for rule in rules:
+        mask = rule.match(types, degree, has_neighbor) & ~retyped
+        if np.any(mask):
+            new_types[mask] = rule.new_type
+            retyped |= mask
+            n_types = max(n_types, rule.new_type)
+    return new_types, n_types
+
+def update_n_atom_types(preamble, n_types):
+    # Update the number of atom types in the preamble
+    preamble = list(preamble)
+    for i in range(0, len(preamble) - 1):
+        l = preamble[i]
+        if "atom types" in l:
+            preamble[i] = "{0:d} atom types".format(n_types)
+    return preamble
+
+def grow(array, size):
+    if size <= array.size:
+        return array
+    grown = np.zeros(max(size, 2 * array.size), dtype=array.dtype)
+    grown[:array.size] = array
+    return grown
+
+def scan_atoms_and_bonds(infile, rules):
+    '''
+    First streaming pass: the type, bond count and neighbour types of every
+    atom, in arrays indexed by atom id
+    '''
+    neighbor_types = sorted(set([rule.neighbor_type for rule in rules if rule.neighbor_type is not None]))
+    types = np.zeros(0, dtype=np.int32)
+    degree = np.zeros(0, dtype=np.int32)
+    neighbors = {t: np.zeros(0, dtype=np.int32) for t in neighbor_types}
+    for section, item in lammps_data.iter_data(infile, lammps_data.STREAM_CHUNK):
+        if section == Section.atoms:
+            types = grow(types, int(item['id'].max()) + 1)
+            types[item['id']] = item['type']
+            timings.count("scan", item.size)
+        elif section == Section.bonds:
+            atom_1 = item['atom_1']
+            atom_2 = item['atom_2']
+            for ids in [atom_1, atom_2]:
+                if ids.min() < 0 or ids.max() >= types.size or np.any(types[ids] == 0):
+                    missing = ids[(ids < 0) | (ids >= types.size)]
+                    if missing.size == 0:
+                        missing = ids[types[ids] == 0]
+                    raise Exception("Atom {0:d} is referenced but not defined in the Atoms section".format(int(missing[0])))
+            degree = grow(degree, types.size)
+            np.add.at(degree, atom_1, 1)
+            np.add.at(degree, atom_2, 1)
+            for t in neighbor_types:
+                neighbors[t] = grow(neighbors[t], types.size)
+                np.add.at(neighbors[t], atom_1, types[atom_2] == t)
+                np.add.at(neighbors[t], atom_2, types[atom_1] == t)
+            timings.count("scan", item.size)
+    degree = grow(degree, types.size)[:types.size]
+    neighbors = {t: grow(count, types.size)[:types.size] for t, count in neighbors.items()}
+    return types, degree, neighbors
+
+def stream_retype(infile, out, rules):
+    with timings.phase("scan"):
+        types, degree, neighbors = scan_atoms_and_bonds(infile, rules)
+    defined = types > 0
+    with timings.phase("compute", int(np.count_nonzero(defined))):
+        new_types, n_types = apply_rules(rules, types[defined], degree[defined], lambda t: neighbors[t][defined] > 0)
+        types[defined] = new_types
+
+    # second pass: rewrite the file with the new types
+    infile.seek(0)
+    with timings.phase("rewrite"):
+        writer = lammps_data.DataWriter(out, lambda lines: update_n_atom_types(lines, n_types))
+        for section, item in lammps_data.iter_data(infile, lammps_data.STREAM_CHUNK):
+            if section == Section.atoms:
+                item['type'] = types[item['id']]
+                timings.count("rewrite", item.size)
+            writer.write(section, item)
+        writer.close()
+
+def add_arguments(parser):
+    '''
+    Options of the retype stage
+    '''
+    parser.add_argument("-r", "--retype", help="parameters: x1,y1,z1[,w1][;x2,y2,z2[,w2];...xn,yn,zn[,wn]] change atom " \
+                                                        "type x to atom type z if atom of type x " \
+                                                        "participates in y bonds (y may be a number, end, branch or *) " \
+                                                        "and, if w is given, is bonded to an atom of type w",
+                        type=str, required=True)
+
+def retype(types, rows_1, rows_2, rules):
+    '''
+    New atom types and the highest atom type in use for atoms of the given
+    types bonded by rows_1/rows_2 (rows into types); rules is a list of
+    RetypeRule or a rule string as given to --retype
+    '''
+    if isinstance(rules, str):
+        rules = parse_rules(rules)
+    graph = BondGraph(rows_1, rows_2, types.size)
+    return apply_rules(rules, types, graph.degree, lambda t: graph.neighbor_count(types == t) > 0)
+
+def retype_data(data, rules):
+    '''
+    Retype the atoms of data in place and update the atom type count; return
+    the number of atom types
+    '''
+    data.atoms['type'], n_types = retype(data.atoms['type'].copy(), data.atom_rows(data.bonds['atom_1']),
+                                         data.atom_rows(data.bonds['atom_2']), rules)
+    data.preamble = update_n_atom_types(data.preamble, n_types)
+    return n_types
+
+def run(data, args, report=None):
+    with timings.phase("compute", data.atoms.size):
+        retype_data(data, args.retype)
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    lammps_data.add_input_arguments(parser)
+    lammps_data.add_output_arguments(parser)
+    parser.add_argument("--stream", help="process the input in two passes, keeping only a few integers per atom "
+                        "in memory (requires --input)", action="store_true")
+    args = parser.parse_args()
+    if args.stream and args.input is None:
+        raise Exception("Streaming mode needs a seekable --input file")
+
+    if args.stream:
+        timings.configure(args)
+        out = lammps_data.open_output(args)
+        with compressed_io.open_input(args.input, args.io_thread) as infile:
+            stream_retype(infile, out, parse_rules(args.retype))
     else:
-        # copy over each line
-        copy_line(line, section)
-
-if not retype_done:
-    do_retype()
-
-# Update the number of atom types in the preamble
-preamble = data_out[Section.preamble]
-for i in range(0, len(preamble) - 1):
-    l = preamble[i]
-    if "atom types" in l:
-        preamble[i] = "{0:d} atom types".format(n_types)
-
-# Print the sections in order
-for s in [Section.preamble, Section.atoms, Section.other, Section.bonds, Section.rest]:
-    for line in data_out[s]:
-        print(line.rstrip())
+        data = lammps_data.load_data(args)
+        run(data, args)
+        # Print the sections in order
+        out = lammps_data.open_output(args)
+        lammps_data.write_data(data, out)
+    if args.output is not None:
+        out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+# Usage:
+# run_pipeline.py [-i data.in] [-o data.out] [--report report.out] "<stage> [options]" ["<stage> [options]" ...]
+# e.g. run_pipeline.py -i data.in -o data.out "unwrap --connectivity" "retype -r 1,end,2" "report --summary"
+# Read a LAMMPS data file once, apply the given stages to it in order in
+# memory and write the result once. A stage takes the options of the script
+# it comes from (see the stage names below); the data file options (-i,
+# --cache, -j, ...) are given once, before the stages. Reports are written to
+# the --report file, or to stderr while the data file goes to stdout. With
+# --no-write, only the reports are produced (to stdout by default).
+
+import sys
+import argparse
+import importlib
+import shlex
+import lammps_data
+import compressed_io
+
+# stage name: module implementing add_arguments(parser) and run(data, args, report)
+STAGES = {"unwrap": "unwrap_periodic",
+          "retype": "retype_atoms_by_bonds",
+          "report": "report_bond_lengths",
+          "contacts": "report_close_contacts",
+          "energy": "report_bond_energy"}
+
+class Stage:
+    def __init__(self, spec):
+        words = shlex.split(spec)
+        if not words or words[0] not in STAGES:
+            raise Exception("Unknown stage '{0:s}'; supported stages: {1:s}".format(spec, ", ".join(sorted(STAGES))))
+        self.name = words[0]
+        self.module = importlib.import_module(STAGES[self.name])
+        parser = argparse.ArgumentParser(prog=self.name)
+        self.module.add_arguments(parser)
+        self.args = parser.parse_args(words[1:])
+
+    def run(self, data, report):
+        self.module.run(data, self.args, report)
+
+def run_stages(data, stages, report):
+    for stage in stages:
+        stage.run(data, report)
+        report.flush()
+
+def main():
+    parser = argparse.ArgumentParser()
+    lammps_data.add_input_arguments(parser)
+    lammps_data.add_output_arguments(parser)
+    parser.add_argument("--report", help="write the reports of the stages to REPORT", type=str)
+    parser.add_argument("--no-write", help="do not write the data file", action="store_true")
+    parser.add_argument("stages", help="stages to apply in order, each a quoted stage name followed by its options; "
+                        "stages: {0:s}".format(", ".join(sorted(STAGES))), nargs="+")
+    args = parser.parse_args()
+    # parse all stage options before reading anything
+    stages = [Stage(spec) for spec in args.stages]
+
+    data = lammps_data.load_data(args)
+    if args.report is not None:
+        report = compressed_io.open_output(args.report)
+    elif args.no_write:
+        report = sys.stdout
+    else:
+        report = sys.stderr
+    run_stages(data, stages, report)
+    if args.report is not None:
+        report.close()
+
+    if args.no_write:
+        return
+    out = lammps_data.open_output(args)
+    lammps_data.write_data(data, out)
+    if args.output is not None:
+        out.close()
+
+if __name__ == "__main__":
+    main()
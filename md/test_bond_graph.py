@@ -0,0 +1,68 @@
+# Connected components and traversal of the bond graph, and the unwrapping of
+# molecules along it. Run with python -m pytest.
+
+import os
+import numpy as np
+import lammps_data
+import unwrap_periodic
+from bond_graph import BondGraph
+
+TESTDATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata")
+
+def reference_components(rows_1, rows_2, natoms):
+    # union-find, one edge at a time
+    parent = list(range(natoms))
+    def find(r):
+        while parent[r] != r:
+            r = parent[r]
+        return r
+    for r1, r2 in zip(rows_1.tolist(), rows_2.tolist()):
+        root_1, root_2 = find(r1), find(r2)
+        parent[max(root_1, root_2)] = min(root_1, root_2)
+    return np.array([find(r) for r in range(natoms)])
+
+def random_graph(seed, natoms=300, nbonds=250):
+    rng = np.random.default_rng(seed)
+    rows_1 = rng.integers(0, natoms, nbonds)
+    rows_2 = rng.integers(0, natoms, nbonds)
+    keep = rows_1 != rows_2
+    return rows_1[keep], rows_2[keep], natoms
+
+def test_components():
+    for seed in range(5):
+        rows_1, rows_2, natoms = random_graph(seed)
+        labels = BondGraph(rows_1, rows_2, natoms).components()
+        assert np.array_equal(labels, reference_components(rows_1, rows_2, natoms))
+
+def test_traverse():
+    rows_1, rows_2, natoms = random_graph(0)
+    graph = BondGraph(rows_1, rows_2, natoms)
+    labels = graph.components()
+    seeds = np.flatnonzero(labels == np.arange(natoms))
+    bonded = set(zip(rows_1.tolist(), rows_2.tolist())) | set(zip(rows_2.tolist(), rows_1.tolist()))
+    reached = seeds.tolist()
+    previous = set(reached)
+    for parents, children in graph.traverse(seeds):
+        assert set(parents.tolist()) <= previous
+        assert all((p, c) in bonded for p, c in zip(parents.tolist(), children.tolist()))
+        reached += children.tolist()
+        previous = set(children.tolist())
+    # every atom is reached exactly once
+    assert sorted(reached) == list(range(natoms))
+
+def test_unwrap_connectivity():
+    data = lammps_data.read_file(os.path.join(TESTDATA, "kg_melt.data"))
+    rows_1 = data.atom_rows(data.bonds['atom_1'])
+    rows_2 = data.atom_rows(data.bonds['atom_2'])
+    expected = data.atoms['pos'][rows_2] - data.atoms['pos'][rows_1]
+    lammps_data.minimum_image(expected, data.box.lengths())
+
+    unwrap_periodic.unwrap_data(data, connectivity=True, reassign_mol=True)
+    assert np.all(data.atoms['image'] == 0)
+    bonds = data.atoms['pos'][rows_2] - data.atoms['pos'][rows_1]
+    assert np.allclose(bonds, expected)
+    # one molecule id per component, numbered in order of appearance
+    labels = reference_components(rows_1, rows_2, data.atoms.size)
+    first_rows = np.unique(labels)
+    assert np.array_equal(data.atoms['mol'], data.atoms['mol'][labels])
+    assert np.array_equal(data.atoms['mol'][first_rows], np.arange(1, first_rows.size + 1))
@@ -0,0 +1,32 @@
+# The cell-list pair search against a brute-force O(N^2) minimum image search.
+# Run with python -m pytest.
+
+import numpy as np
+import pytest
+import lammps_data
+import cell_list
+
+def brute_force_pairs(pos, lengths, cutoff):
+    i, j = np.triu_indices(pos.shape[0], 1)
+    dist = pos[j] - pos[i]
+    dist -= lengths * np.round(dist / lengths)
+    d = np.sqrt((dist * dist).sum(axis=1))
+    close = d < cutoff
+    return i[close], j[close], d[close]
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_close_pairs(seed):
+    rng = np.random.default_rng(seed)
+    # non-cubic, with 2 cells along y and atoms also outside the box
+    box = lammps_data.Box(-1., 4.3, 0.5, 2.9, 2., 9.1)
+    lengths = box.lengths()
+    pos = box.lower() + rng.uniform(-0.5, 1.5, (400, 3)) * lengths
+    cutoff = 1.0
+    i, j, d = cell_list.close_pairs(pos, box, cutoff)
+    assert np.all(i < j)
+    expected_i, expected_j, expected_d = brute_force_pairs(pos, lengths, cutoff)
+    order = np.lexsort((j, i))
+    expected_order = np.lexsort((expected_j, expected_i))
+    assert np.array_equal(i[order], expected_i[expected_order])
+    assert np.array_equal(j[order], expected_j[expected_order])
+    assert np.allclose(d[order], expected_d[expected_order])
@@ -0,0 +1,34 @@
+# The chain.f density and its inverse solves: solving for the padding or the
+# number of atoms from the computed density gives back the inputs, on both
+# sides of the sign change of the radical. Run with python -m pytest.
+
+import numpy as np
+import calculate_chain_density as ccd
+
+def inputs():
+    return ccd.grid({"num_atoms": [100., 1000., 32000., 1e6], "reduced_density": [0.3, 0.85, 1.1],
+                     "padding": [0.05, 1., 3., 10., 40.]})
+
+def test_both_branches():
+    columns = inputs()
+    rad = ccd.radical(columns["num_atoms"], columns["reduced_density"], columns["padding"])
+    assert np.any(rad >= 0.) and np.any(rad < 0.)
+
+def test_original_value():
+    # as printed by the original script
+    assert float(ccd.adjusted_density(1000, 0.85, 1.0)) == 0.9330593803536923
+    assert float(ccd.adjusted_density(1000, 0.85, 0.)) == 0.85
+
+def test_solve_padding():
+    columns = ccd.evaluate(inputs())
+    padding = ccd.solve_padding(columns["num_atoms"], columns["reduced_density"], columns["chain_density"])
+    assert np.allclose(padding, columns["padding"], rtol=1e-9)
+
+def test_solve_num_atoms():
+    columns = ccd.evaluate(inputs())
+    n = ccd.solve_num_atoms(columns["reduced_density"], columns["padding"], columns["chain_density"])
+    assert np.allclose(n, columns["num_atoms"], rtol=1e-9)
+
+def test_impossible():
+    assert np.isnan(ccd.solve_num_atoms(0.85, 1.0, 0.8))
+    assert np.isnan(ccd.solve_padding(1000., 0.85, 0.8))
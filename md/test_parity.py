@@ -0,0 +1,123 @@
+# Parity of the read paths of the md tools with the scripts they replaced.
+#
+# testdata/kg_melt.data is a 600-atom melt in the format the original scripts
+# read, with inconsistent image flags and a Velocities section; the
+# testdata/kg_melt.*.out files are the outputs of the original
+# unwrap_periodic.py, report_bond_lengths.py and
+# retype_atoms_by_bonds.py -r 1,1,2 for it. Every way of reading the file
+# (serial, parallel, cached, streaming, compressed) must reproduce them byte
+# for byte. Run with python -m pytest.
+
+import io
+import os
+import gzip
+import shutil
+import pytest
+import lammps_data
+import parallel_read
+import data_cache
+import compressed_io
+import unwrap_periodic
+import retype_atoms_by_bonds
+import report_bond_lengths
+
+TESTDATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testdata")
+RETYPE_RULES = "1,1,2"
+
+def expected(tool):
+    with open(os.path.join(TESTDATA, "kg_melt.{0:s}.out".format(tool))) as f:
+        return f.read()
+
+@pytest.fixture
+def data_path(tmp_path):
+    # a private copy, so that the cache is created next to it
+    path = str(tmp_path / "kg_melt.data")
+    shutil.copy(os.path.join(TESTDATA, "kg_melt.data"), path)
+    return path
+
+@pytest.fixture
+def gzip_path(data_path):
+    path = data_path + ".gz"
+    with open(data_path, 'rb') as f, gzip.open(path, 'wb') as out:
+        shutil.copyfileobj(f, out)
+    return path
+
+def read_serial(path):
+    return lammps_data.read_file(path)
+
+def read_parallel(path):
+    return lammps_data.read_file(path, workers=2)
+
+def read_cached(path):
+    # the first load fills the cache, the second must not parse the file
+    data_cache.load(path)
+    parse = lammps_data.read_file
+    def no_parse(*args):
+        raise Exception("cache miss on the second load")
+    lammps_data.read_file = no_parse
+    try:
+        return data_cache.load(path)
+    finally:
+        lammps_data.read_file = parse
+
+def unwrap(data):
+    unwrap_periodic.unwrap_data(data)
+    out = io.StringIO()
+    lammps_data.write_data(data, out)
+    return out.getvalue()
+
+def report(data):
+    out = io.StringIO()
+    report_bond_lengths.report_data(out, data, 2.5)
+    return out.getvalue()
+
+def retype(data):
+    retype_atoms_by_bonds.retype_data(data, RETYPE_RULES)
+    out = io.StringIO()
+    lammps_data.write_data(data, out)
+    return out.getvalue()
+
+READERS = {"serial": read_serial, "parallel": read_parallel, "cached": read_cached}
+TOOLS = {"unwrap": unwrap, "report": report, "retype": retype}
+
+@pytest.fixture(autouse=True)
+def small_sections(monkeypatch):
+    # split the sections of the small test file between the workers
+    monkeypatch.setattr(parallel_read, "MIN_CHUNK_BYTES", 4096)
+
+@pytest.mark.parametrize("reader", sorted(READERS))
+@pytest.mark.parametrize("tool", sorted(TOOLS))
+def test_read_paths(data_path, reader, tool):
+    assert TOOLS[tool](READERS[reader](data_path)) == expected(tool)
+
+@pytest.mark.parametrize("threaded", [False, True])
+@pytest.mark.parametrize("tool", sorted(TOOLS))
+def test_compressed_input(gzip_path, tool, threaded):
+    assert TOOLS[tool](lammps_data.read_file(gzip_path, threaded=threaded)) == expected(tool)
+
+def test_parallel_arrays(data_path):
+    serial = read_serial(data_path)
+    parallel = read_parallel(data_path)
+    assert (serial.atoms == parallel.atoms).all()
+    assert (serial.bonds == parallel.bonds).all()
+    assert (serial.preamble, serial.other, serial.rest) == (parallel.preamble, parallel.other, parallel.rest)
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # split the small test file into several chunks
+    monkeypatch.setattr(lammps_data, "STREAM_CHUNK", 64)
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_stream_unwrap(data_path, gzip_path, small_chunks, threaded):
+    # the threaded read-ahead of the compressed file is rewound between passes
+    out = io.StringIO()
+    with compressed_io.open_input(gzip_path if threaded else data_path, threaded) as infile:
+        unwrap_periodic.stream_unwrap(infile, out)
+    assert out.getvalue() == expected("unwrap")
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_stream_retype(data_path, gzip_path, small_chunks, threaded):
+    out = io.StringIO()
+    with compressed_io.open_input(gzip_path if threaded else data_path, threaded) as infile:
+        retype_atoms_by_bonds.stream_retype(infile, out, retype_atoms_by_bonds.parse_rules(RETYPE_RULES))
+    assert out.getvalue() == expected("retype")
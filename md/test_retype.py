@@ -0,0 +1,89 @@
+# Retype rules with end, branch, * and neighbour types: the in-memory and the
+# streaming modes against a rule-by-rule reference on a branched random
+# polymer with sparse, shuffled atom ids. Run with python -m pytest.
+
+import io
+import numpy as np
+import lammps_data
+import retype_atoms_by_bonds
+
+RULES = "1,end,3;1,branch,4,2;2,*,5,1;1,2,6;2,0,7"
+
+def branched_data(seed=0, natoms=400):
+    '''
+    A random forest with atoms of types 1 and 2 and a few isolated atoms
+    '''
+    rng = np.random.default_rng(seed)
+    data = lammps_data.DataFile()
+    atoms = np.zeros(natoms, dtype=lammps_data.ATOM_DTYPE)
+    atoms['id'] = rng.permutation(np.arange(1, 3 * natoms, 3))[:natoms]
+    atoms['mol'] = 1
+    atoms['type'] = rng.integers(1, 3, natoms)
+    atoms['pos'] = rng.uniform(0., 10., (natoms, 3))
+    data.atoms = atoms
+    # each atom bonds to a random earlier one, except the roots
+    children = np.flatnonzero(rng.uniform(size=natoms) > 0.05)
+    children = children[children > 0]
+    parents = (rng.uniform(size=children.size) * children).astype(np.int64)
+    bonds = np.zeros(children.size, dtype=lammps_data.BOND_DTYPE)
+    bonds['id'] = np.arange(1, children.size + 1)
+    bonds['type'] = 1
+    bonds['atom_1'] = atoms['id'][parents]
+    bonds['atom_2'] = atoms['id'][children]
+    data.bonds = bonds
+    data.box = lammps_data.Box(0., 10., 0., 10., 0., 10.)
+    data.preamble = ["LAMMPS data file", "", "{0:d} atoms".format(natoms), "{0:d} bonds".format(bonds.size), "",
+                     "2 atom types", "1 bond types", "", str(data.box), ""]
+    data.other = []
+    data.rest = []
+    return data
+
+def reference_types(data, rules):
+    # the first rule that matches the original type, bond count and neighbours
+    rows = {atom_id: row for row, atom_id in enumerate(data.atoms['id'].tolist())}
+    types = data.atoms['type'].tolist()
+    neighbors = [[] for row in range(len(types))]
+    for atom_1, atom_2 in zip(data.bonds['atom_1'].tolist(), data.bonds['atom_2'].tolist()):
+        neighbors[rows[atom_1]].append(rows[atom_2])
+        neighbors[rows[atom_2]].append(rows[atom_1])
+    new_types = list(types)
+    for row, atom_type in enumerate(types):
+        degree = len(neighbors[row])
+        for rule in rules:
+            if rule.atom_type != atom_type:
+                continue
+            if rule.nbonds == "end" and degree != 1 or rule.nbonds == "branch" and degree < 3:
+                continue
+            if rule.nbonds not in ["end", "branch", "*"] and degree != rule.nbonds:
+                continue
+            if rule.neighbor_type is not None and rule.neighbor_type not in [types[n] for n in neighbors[row]]:
+                continue
+            new_types[row] = rule.new_type
+            break
+    return new_types
+
+def test_retype_rules():
+    data = branched_data()
+    rules = retype_atoms_by_bonds.parse_rules(RULES)
+    expected = reference_types(data, rules)
+    # every rule is exercised
+    assert set(expected) - set(data.atoms['type'].tolist()) == set([3, 4, 5, 6, 7])
+    n_types = retype_atoms_by_bonds.retype_data(data, RULES)
+    assert data.atoms['type'].tolist() == expected
+    assert n_types == 7
+    assert "7 atom types" in data.preamble
+
+def test_stream_retype(tmp_path):
+    data = branched_data()
+    path = str(tmp_path / "branched.data")
+    with open(path, "w") as out:
+        lammps_data.write_data(data, out)
+
+    retype_atoms_by_bonds.retype_data(data, RULES)
+    in_memory = io.StringIO()
+    lammps_data.write_data(data, in_memory)
+
+    streamed = io.StringIO()
+    with open(path) as infile:
+        retype_atoms_by_bonds.stream_retype(infile, streamed, retype_atoms_by_bonds.parse_rules(RULES))
+    assert streamed.getvalue() == in_memory.getvalue()
@@ -0,0 +1,214 @@
+# Optional accounting of where a run of the md tools spends its time.
+#
+# A run is split into named phases (preamble, atoms and bonds while reading,
+# then compute and write); for each, the wall time, the number of records
+# handled and the peak RSS are collected. On Linux, the high-water mark of the
+# RSS is reset when a phase starts (/proc/self/clear_refs), so the peak is
+# that of the phase itself; elsewhere it is the peak of the process up to the
+# end of the phase, and the report says so. Memory is sampled when a phase
+# starts and ends only. Tools enable it with the --timings option of
+# lammps_data.add_input_arguments and the report is written to stderr or to a
+# JSON file when the process exits. While it is disabled, current is None and
+# phase() costs one comparison.
+
+import sys
+import json
+import time
+import atexit
+import resource
+import contextlib
+
+# records read between memory samples while a data file is parsed
+SAMPLE_RECORDS = 1 << 16
+
+class Timings:
+    def __init__(self):
+        self.phases = []   # in order of first use
+        self.by_name = {}
+        self.open = []     # the phases running now, outermost first
+        self.start = time.perf_counter()
+        self.per_phase = reset_peak()
+        self.process_peak = 0.
+
+    def entry(self, name):
+        if name not in self.by_name:
+            self.by_name[name] = {"phase": name, "seconds": 0., "records": 0, "peak_rss_mib": 0.}
+            self.phases.append(self.by_name[name])
+        return self.by_name[name]
+
+    def add(self, name, seconds, records=0):
+        entry = self.entry(name)
+        entry["seconds"] += seconds
+        entry["records"] += records
+
+    def sample(self):
+        '''
+        Credit the peak RSS since the last sample to the running phases and
+        start a new interval
+        '''
+        peak = high_water_mib() if self.per_phase else peak_rss_mib()
+        self.process_peak = max(self.process_peak, peak)
+        for entry in self.open:
+            entry["peak_rss_mib"] = max(entry["peak_rss_mib"], peak)
+        if self.per_phase:
+            reset_peak()
+
+    def push(self, name):
+        # what is resident when a phase starts counts towards its peak
+        entry = self.entry(name)
+        entry["peak_rss_mib"] = max(entry["peak_rss_mib"], rss_mib() if self.per_phase else peak_rss_mib())
+        self.open.append(entry)
+
+    def enter(self, name):
+        self.sample()
+        self.push(name)
+
+    def exit(self):
+        self.sample()
+        self.open.pop()
+
+    @contextlib.contextmanager
+    def phase(self, name, records=0):
+        self.enter(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, records)
+            self.exit()
+
+    def sections(self, items):
+        '''
+        Pass through the (section, item) pairs of lammps_data.iter_data,
+        adding the time spent producing each one to the phase of its section
+        '''
+        items = iter(items)
+        current = None
+        seconds = 0.
+        records = 0
+        try:
+            while True:
+                # sample once per record chunk, not for every text line
+                if records >= SAMPLE_RECORDS:
+                    self.add(current, seconds, records)
+                    seconds, records = 0., 0
+                    self.sample()
+                start = time.perf_counter()
+                try:
+                    section, item = next(items)
+                except StopIteration:
+                    return
+                elapsed = time.perf_counter() - start
+                if section.name != current:
+                    # the memory used since the last sample went into this item
+                    if current is not None:
+                        self.add(current, seconds, records)
+                        seconds, records = 0., 0
+                        self.open.pop()
+                    current = section.name
+                    self.push(current)
+                    self.sample()
+                seconds += elapsed
+                records += item.size if hasattr(item, "dtype") else 1
+                yield section, item
+        finally:
+            if current is not None:
+                self.add(current, seconds, records)
+                self.exit()
+
+    def results(self):
+        self.sample()
+        for entry in self.phases:
+            entry["records_per_s"] = entry["records"] / entry["seconds"] if entry["seconds"] > 0. else None
+        return {"phases": self.phases, "total_seconds": time.perf_counter() - self.start,
+                "peak_rss_mib": self.process_peak,
+                "phase_peak_rss": "phase" if self.per_phase else "process up to the end of the phase"}
+
+    def write(self, out):
+        results = self.results()
+        out.write("# phase seconds records records/s peak_rss_mib (peak of the {0:s})\n".format(
+            results["phase_peak_rss"]))
+        for entry in results["phases"]:
+            out.write("{0:s} {1:.6f} {2:d} {3:.4g} {4:.1f}\n".format(entry["phase"], entry["seconds"],
+                                                                   entry["records"], entry["records_per_s"] or 0.,
+                                                                   entry["peak_rss_mib"]))
+        out.write("total {0:.6f} - - {1:.1f}\n".format(results["total_seconds"], results["peak_rss_mib"]))
+
+def peak_rss_mib():
+    '''
+    High-water mark of the RSS of the process (since the last reset_peak)
+    '''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1048576. if sys.platform == "darwin" else 1024.)
+
+def status_mib(field):
+    # a memory field of /proc/self/status, e.g. VmHWM
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024.
+    except (OSError, ValueError, IndexError):
+        pass
+    return peak_rss_mib()
+
+def high_water_mib():
+    return status_mib("VmHWM")
+
+def rss_mib():
+    return status_mib("VmRSS")
+
+def reset_peak():
+    '''
+    Reset the high-water mark of the RSS if the system allows it (Linux 4.0
+    and later); return whether it did
+    '''
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+# the Timings of this run, if enabled
+current = None
+
+def report(path):
+    if path == "-":
+        current.write(sys.stderr)
+    else:
+        with open(path, "w") as out:
+            json.dump(current.results(), out, indent=1)
+
+def enable(path="-"):
+    '''
+    Start collecting; the report goes to stderr, or as JSON to path, at exit
+    '''
+    global current
+    if current is None:
+        current = Timings()
+        atexit.register(report, path)
+    return current
+
+def configure(args):
+    '''
+    Enable collecting if the --timings option was given
+    '''
+    if getattr(args, "timings", None) is not None:
+        enable(args.timings)
+
+@contextlib.contextmanager
+def phase(name, records=0):
+    if current is None:
+        yield
+    else:
+        with current.phase(name, records):
+            yield
+
+def count(name, records):
+    '''
+    Add records to a phase that was timed without knowing their number
+    '''
+    if current is not None:
+        current.add(name, 0., records)
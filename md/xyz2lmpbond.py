@@ -1,68 +1,175 @@
 #!/usr/bin/env python3
 
 # Usage:
-# xyz2lmpbond.py <atom_type> <mass> <molecule_type> <starting_atom_ID> < data.xyz > data.out
+# xyz2lmpbond.py [--frame N] [--padding P] <starting_atom_ID> <atom_type> <molecule_id> <mass> < data.xyz > data.out
+# xyz2lmpbond.py --atoms-only <starting_atom_ID> <atom_type> <molecule_id> <mass> < data.xyz > atoms.out
+# xyz2lmpbond.py -i data.xyz.gz -o data.out.gz <starting_atom_ID> <atom_type> <molecule_id> <mass>
 # Convert a XYZ file with a single atom type to a LAMMPS data file using the 'bond' atom style.
+# The data file gets a box fitted around the atoms (or the one given with --box) and a Masses
+# section with the given mass for every atom type up to atom_type. With --atoms-only, only the
+# atom lines are written, for pasting into an existing data file. Of a XYZ file with several
+# frames, the first is converted unless another one is selected with --frame.
 
-import sys
+import re
 import argparse
-from enum import Enum
+import itertools
+import collections
+import numpy as np
+import lammps_data
+import compressed_io
 
-# A 'bond' atom style atom
-class AtomBond:
-    # initialize from xyz file line and some known values
-    def __init__(self, xyz_line, atom_id, mol_id, atom_type):
-        contents = xyz_line.split()
-        num_values = len(contents)
-        if num_values != 4:
-            raise Exception("A xyz line is expected to have 4 values: {0:d} found." \
-            "\nLine: {1:s}".format(num_values, xyz_line))
-        self.atom_id = atom_id
-        self.mol_id = mol_id
-        self.atom_type = atom_type
-        self.x = float(contents[1])
-        self.y = float(contents[2])
-        self.z = float(contents[3])
-        self.nx = 0
-        self.ny = 0
-        self.nz = 0
+# number of XYZ atom lines parsed at once
+XYZ_CHUNK = 1 << 20
 
-    def __str__(self):
-        return "{0:10d} {1:7d} {2:7d} {3:9.4f} {4:9.4f} {5:9.4f} {6:3d} {7:3d} {8:3d}".format(self.atom_id,
-                                                                              self.mol_id,
-                                                                              self.atom_type,
-                                                                              self.x,
-                                                                              self.y,
-                                                                              self.z,
-                                                                              self.nx,
-                                                                              self.ny,
-                                                                              self.nz)
+# the element (first) column of every line
+FIRST_COLUMN = re.compile(r'^[ \t]*\S+', re.MULTILINE)
 
-parser = argparse.ArgumentParser()
-parser.add_argument("starting_atom_index", help="the first atom index for the wall particles (e.g. one past the last atom index in the target file)")
-parser.add_argument("atom_type", help="the atom type of the wall particles")
-parser.add_argument("mol_id", help="the molecule id of the wall particles")
-parser.add_argument("mass", help="the mass of each wall particle")
-args = parser.parse_args()
+def parse_xyz_lines(lines):
+    '''
+    Coordinates of a list of XYZ atom lines as an (n, 3) array
+    '''
+    values = np.fromstring(FIRST_COLUMN.sub('', "".join(lines)), sep=' ')
+    if values.size != 3 * len(lines):
+        # find the offending line for the error message
+        for line in lines:
+            num_values = len(line.split())
+            if num_values != 4:
+                raise Exception("A xyz line is expected to have 4 values: {0:d} found." \
+                "\nLine: {1:s}".format(num_values, line))
+        raise Exception("Malformed coordinates in a XYZ frame")
+    return values.reshape(-1, 3)
 
-atom_idx = int(args.starting_atom_index)
-atom_type = int(args.atom_type)
-mol_id = int(args.mol_id)
-mass = float(args.mass)
+def read_xyz_frame(stream, skip=False):
+    '''
+    Read the next frame of a XYZ file and return (comment, positions), with
+    positions None if skip is set, or None at the end of the file
+    '''
+    line = stream.readline()
+    while line and not line.strip():
+        line = stream.readline()
+    if not line:
+        return None
+    # the first line contains the number of atoms in the frame
+    atoms_expected = int(line)
+    # the second line is reserved for comments
+    comment = stream.readline().strip()
+    pos = None if skip else np.empty((atoms_expected, 3))
+    num_read = 0
+    while num_read < atoms_expected:
+        lines = list(itertools.islice(stream, min(XYZ_CHUNK, atoms_expected - num_read)))
+        if not lines:
+            raise Exception("A XYZ frame ends after {0:d} of {1:d} atoms".format(num_read, atoms_expected))
+        if not skip:
+            pos[num_read:num_read + len(lines)] = parse_xyz_lines(lines)
+        num_read += len(lines)
+    return comment, pos
 
-atoms_expected = 0
-line_idx = -1
-#atoms = {} # indexed by atom id
+def select_frame(stream, index=0):
+    '''
+    (comment, positions) of frame index of a XYZ file, counted from 0; a
+    negative index counts from the last frame
+    '''
+    if index >= 0:
+        for num_frames in range(index):
+            if read_xyz_frame(stream, skip=True) is None:
+                raise Exception("The XYZ file has only {0:d} frames".format(num_frames))
+        frame = read_xyz_frame(stream)
+        if frame is None:
+            raise Exception("The XYZ file has only {0:d} frames".format(index))
+        return frame
+    # keep the last -index frames
+    frames = collections.deque(maxlen=-index)
+    frame = read_xyz_frame(stream)
+    while frame is not None:
+        frames.append(frame)
+        frame = read_xyz_frame(stream)
+    if len(frames) < -index:
+        raise Exception("The XYZ file has only {0:d} frames".format(len(frames)))
+    return frames[0]
 
-for line in sys.stdin:
-    line_idx += 1
-    if line_idx == 0:
-        # the first line contains the number of atoms in the xyz file
-        atoms_expected = int(line)
-    elif line_idx == 1:
-        # the second line is reserved for comments: skip it
-        continue
-    else:
-        atom = AtomBond(line, atom_idx, mol_id, atom_type)
-        atom_idx += 1
-        print(atom)
+def fit_box(pos, padding):
+    if pos.shape[0] == 0:
+        return lammps_data.Box(0., 0., 0., 0., 0., 0.)
+    lo = pos.min(axis=0) - padding
+    hi = pos.max(axis=0) + padding
+    return lammps_data.Box(lo[0], hi[0], lo[1], hi[1], lo[2], hi[2])
+
+def data_preamble(natoms, box, atom_type, mass, title):
+    '''
+    Header, box and Masses lines of a data file holding atoms of types up to atom_type
+    '''
+    preamble = [title, "", "{0:d} atoms".format(natoms), "", "{0:d} atom types".format(atom_type), "",
+                str(box), "", "Masses", ""]
+    preamble += ["{0:d} {1}".format(t, mass) for t in range(1, atom_type + 1)]
+    preamble.append("")
+    return preamble
+
+def write_atoms(out, pos, first_id, mol_id, atom_type):
+    '''
+    Write atom lines for the positions pos in blocks, with consecutive ids from first_id
+    '''
+    n = pos.shape[0]
+    ids = np.arange(first_id, first_id + n)
+    zeros = np.zeros(n, dtype=np.int32)
+    lammps_data.write_records(out, lammps_data.PADDED_ATOM_FORMAT,
+                              [ids, np.full(n, mol_id), np.full(n, atom_type), pos[:, 0], pos[:, 1], pos[:, 2],
+                               zeros, zeros, zeros])
+
+def convert(instream, out, atom_idx, atom_type, mol_id, mass=None, frame=0, padding=0.1, box=None):
+    '''
+    Write the atoms of one frame of the XYZ file in instream as 'bond' style
+    atoms with ids from atom_idx: a complete data file, or only the atom
+    lines if mass is None; return the number of atoms written
+    '''
+    comment, pos = select_frame(instream, frame)
+    if mass is not None:
+        if box is None:
+            box = fit_box(pos, padding)
+        writer = lammps_data.DataWriter(out)
+        title = "LAMMPS data file via xyz2lmpbond.py"
+        if comment:
+            title += ", " + comment
+        writer.lines(lammps_data.Section.preamble, data_preamble(pos.shape[0], box, atom_type, mass, title))
+        # there are no bonds, so the data file ends after the atoms
+        writer.advance(lammps_data.Section.atoms)
+    write_atoms(out, pos, atom_idx, mol_id, atom_type)
+    return pos.shape[0]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("starting_atom_index", help="the first atom index for the wall particles (e.g. one past the last atom index in the target file)")
+    parser.add_argument("atom_type", help="the atom type of the wall particles")
+    parser.add_argument("mol_id", help="the molecule id of the wall particles")
+    parser.add_argument("mass", help="the mass of each wall particle")
+    parser.add_argument("--frame", help="the XYZ frame to convert, counted from 0; negative values count from the "
+                        "last frame (default: %(default)s)", type=int, default=0)
+    parser.add_argument("--padding", help="space between the atoms and the fitted box (default: %(default)s)",
+                        type=float, default=0.1)
+    parser.add_argument("--box", help="use this box instead of fitting one to the atoms", type=float, nargs=6,
+                        metavar=("XLO", "XHI", "YLO", "YHI", "ZLO", "ZHI"))
+    parser.add_argument("--atoms-only", help="write only the atom lines instead of a complete data file",
+                        action="store_true")
+    parser.add_argument("-i", "--input", help="read the XYZ file from INPUT instead of stdin; gzip, bzip2 and xz "
+                        "compressed files are recognised", type=str)
+    lammps_data.add_output_arguments(parser)
+    parser.add_argument("--io-thread", help="decompress the input and compress the output in helper threads",
+                        action="store_true")
+    args = parser.parse_args()
+
+    atom_idx = int(args.starting_atom_index)
+    atom_type = int(args.atom_type)
+    mol_id = int(args.mol_id)
+    mass = float(args.mass)
+    box = lammps_data.Box(*args.box) if args.box is not None else None
+
+    instream = compressed_io.open_input(args.input, args.io_thread)
+    out = lammps_data.open_output(args)
+    convert(instream, out, atom_idx, atom_type, mol_id, None if args.atoms_only else mass,
+            args.frame, args.padding, box)
+    if args.output is not None:
+        out.close()
+    if args.input is not None:
+        instream.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# The incremental file index of find_subdirs_contents_match.py against a
+# fresh walk of the tree, after files and directories change. Run with
+# python -m pytest.
+
+import os
+import find_subdirs_contents_match as fsc
+
+def make_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+
+def touch_dir(path, step):
+    # a distinct mtime even on file systems with coarse timestamps
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + step * 1000000000))
+
+def walked(pattern, root):
+    return sorted(fsc.walk(pattern, root, workers=4))
+
+def queried(pattern, root, index):
+    return sorted(index.query(pattern, root))
+
+def test_refresh(tmp_path):
+    root = str(tmp_path / "tree")
+    for path, size in [("a/x.dat", 10), ("a/b/y.dat", 20), ("a/b/c/z.dat", 30), ("a/b/c/w.txt", 5),
+                       ("d/e/v.dat", 40), ("u.dat", 50)]:
+        make_file(os.path.join(root, path), size)
+    index = fsc.FileIndex(str(tmp_path / "index.db"))
+    assert index.refresh(root, workers=4) == 6
+    assert queried("*.dat", root, index) == walked("*.dat", root)
+    # nothing changed: no directory is listed again
+    assert index.refresh(root, workers=4) == 0
+
+    # delete a subtree and add a file elsewhere
+    for path in ["a/b/c/z.dat", "a/b/c/w.txt", "a/b/y.dat"]:
+        os.remove(os.path.join(root, path))
+    os.rmdir(os.path.join(root, "a/b/c"))
+    os.rmdir(os.path.join(root, "a/b"))
+    touch_dir(os.path.join(root, "a"), 1)
+    make_file(os.path.join(root, "d/e/new.dat"), 60)
+    touch_dir(os.path.join(root, "d/e"), 1)
+
+    assert index.refresh(root, workers=4) == 2
+    assert queried("*.dat", root, index) == walked("*.dat", root)
+    assert queried("*.txt", root, index) == []
+    # the deleted directories are gone from the index
+    assert index.mtime(os.path.join(root, "a/b")) is None
+    assert index.mtime(os.path.join(root, "a/b/c")) is None
+    index.close()